@@ -0,0 +1,3 @@
+"""DroidCam 运动检测录像服务"""
+
+__version__ = '0.1.0'
@@ -0,0 +1,98 @@
+"""低成本连续存档：与事件片段并行，按降低的分辨率与帧率持续录制，每小时一个文件
+
+检测漏报时仍有画面可查。存档写在 storage_path/archive/<camera>/ 下，文件名与事件片段相同
+（YYYYmmddHHMMSS.avi + .ts 旁路文件），因此 segments.list_segments 可直接列出；
+每次换文件时删除超过保留期的旧存档。
+"""
+import os
+import time
+import logging
+from datetime import datetime, timedelta
+
+import cv2
+
+from .recorder import SegmentRecorder, timestamps_path
+from .seekindex import index_path
+from .segments import list_segments
+
+ARCHIVE_DIR = 'archive'
+
+
+def archive_dir(root, camera):
+    return os.path.join(root, ARCHIVE_DIR, camera)
+
+
+def archive_size(size, width):
+    """按目标宽度等比缩小 (宽, 高)，高度取偶数；width 为 0 或不小于原宽时保持原尺寸"""
+    w, h = size
+    if width <= 0 or width >= w:
+        return w, h
+    return width, max(2, round(h * width / w / 2) * 2)
+
+
+def prune(directory, keep_days, now=None):
+    """删除已完全超出保留期的存档（含时间戳与定位索引旁路文件），返回释放的字节数"""
+    if keep_days <= 0 or not os.path.isdir(directory):
+        return 0
+    # 文件按开始时间命名，最多覆盖一小时
+    cutoff = datetime.fromtimestamp(now or time.time()) - timedelta(days=keep_days, hours=1)
+    freed = 0
+    for path, start, _ in list_segments(directory):
+        if start >= cutoff:
+            break
+        for p in (path, timestamps_path(path), index_path(path)):
+            try:
+                freed += os.path.getsize(p)
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+    return freed
+
+
+class ArchiveRecorder:
+    """按 fps 抽帧、缩放到 size 后写入当前小时的存档文件"""
+
+    def __init__(self, root, camera, size, fps=2.0, width=320, keep_days=7.0):
+        self.directory = archive_dir(root, camera)
+        os.makedirs(self.directory, exist_ok=True)
+        # 采集分辨率；重连后分辨率不变时沿用同一个存档文件
+        self.source_size = size
+        self.size = archive_size(size, width)
+        self.fps = fps
+        self.interval = 1.0 / fps
+        self.keep_days = keep_days
+        # 存档帧率已经很低，不再做静止帧抑制
+        self._recorder = SegmentRecorder(self.directory, self.size, static_threshold=0)
+        self._hour = None
+        self._next_ts = 0.0
+
+    @property
+    def path(self):
+        return self._recorder.path
+
+    def write(self, frame, ts):
+        """未到下一存档帧时间直接返回 False；只有真正写入的帧才缩放"""
+        if ts < self._next_ts:
+            return False
+        # 按固定节拍推进，采集抖动不会拉低平均帧率；落后太多时重新对齐
+        self._next_ts = self._next_ts + self.interval if ts - self._next_ts < self.interval else ts + self.interval
+
+        hour = time.strftime('%Y%m%d%H', time.localtime(ts))
+        if hour != self._hour:
+            self._rollover(hour)
+
+        if frame.shape[1::-1] != self.size:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        return self._recorder.write(frame, ts)
+
+    def _rollover(self, hour):
+        self._hour = hour
+        path = self._recorder.open(self.fps)
+        logging.info(f"Archive file: {path} ({self.size[0]}x{self.size[1]} @ {self.fps:g} fps)")
+        freed = prune(self.directory, self.keep_days)
+        if freed:
+            logging.info(f"Archive retention: removed {freed / 1048576:.1f} MB older than {self.keep_days:g} days")
+
+    def release(self):
+        self._recorder.release()
+        self._hour = None
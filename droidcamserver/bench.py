@@ -0,0 +1,98 @@
+"""检测吞吐基准：在合成帧或录像文件上测量每帧处理耗时"""
+import os
+import time
+
+import cv2
+import numpy as np
+
+from .detect import MotionDetector
+
+
+def synthetic_frames(count, size=(640, 480), seed=0):
+    """生成带移动方块和噪声的合成帧，尺寸为 (宽, 高)"""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    base = rng.integers(60, 100, (h, w, 3), dtype=np.uint8)
+    for i in range(count):
+        frame = base.copy()
+        x = (i * 7) % max(w - w // 4, 1)
+        cv2.rectangle(frame, (x, h // 4), (x + w // 4, h // 2), (255, 255, 255), -1)
+        yield frame
+
+
+def file_frames(path, count=None):
+    video = cv2.VideoCapture(path)
+    try:
+        n = 0
+        while count is None or n < count:
+            check, frame = video.read()
+            if not check:
+                break
+            yield frame
+            n += 1
+    finally:
+        video.release()
+
+
+def bench_detector(frames, **params):
+    """返回 (帧数, 总耗时秒, 运动帧数)；帧预先载入内存，不计解码时间"""
+    frames = list(frames)
+    detector = MotionDetector(**params)
+    motion_frames = 0
+    start = time.perf_counter()
+    for frame in frames:
+        result = detector.process(frame)
+        if result and result[0]:
+            motion_frames += 1
+    return len(frames), time.perf_counter() - start, motion_frames
+
+
+def soak(count=100000, size=(320, 240), limit_mb=20.0, policy='freeze', record_every=5000):
+    """内存浸泡测试：把 count 帧依次送过检测、时间线与录制，检查预热后 RSS 是否持平
+
+    返回 (预热后增长字节数, 是否在 limit_mb 以内)。
+    """
+    import logging
+    import tempfile
+
+    from .memwatch import MemoryMonitor, apply_gc_policy
+    from .recorder import SegmentRecorder
+    from .timeline import TimelineWriter
+
+    with tempfile.TemporaryDirectory() as tmp:
+        detector = MotionDetector()
+        timeline = TimelineWriter(tmp, 'soak')
+        recorder = SegmentRecorder(tmp, size)
+        memory = MemoryMonitor(interval=float('inf'), warn_mb=limit_mb)
+        apply_gc_policy(policy)
+        warmup = max(count // 20, 1)
+        try:
+            for i, frame in enumerate(synthetic_frames(count, size)):
+                result = detector.process(frame)
+                if result is None:
+                    continue
+                # 周期性开关录制，覆盖 VideoWriter 的创建与释放路径
+                if i % record_every == 0:
+                    if recorder.is_open:
+                        recorder.release()
+                        for name in os.listdir(tmp):
+                            if name.endswith(('.avi', '.ts')):
+                                os.remove(os.path.join(tmp, name))
+                    else:
+                        recorder.open(20.0)
+                recorded = recorder.write(frame, i / 20.0) if recorder.is_open else False
+                timeline.append(i / 20.0, result[1], result[2], recorded)
+                if i == warmup:
+                    memory.baseline = None
+                    memory.sample()
+                elif i > warmup and i % 10000 == 0:
+                    memory.sample()
+            memory.sample()
+        finally:
+            recorder.release()
+            timeline.close()
+    growth = memory.growth()
+    ok = growth <= limit_mb * 1024 * 1024
+    logging.info(f"Soak: {count} frames, rss growth after warm-up {growth / 1048576:+.1f} MB "
+                 f"({'OK' if ok else 'FAIL'}, limit {limit_mb} MB)")
+    return growth, ok
@@ -0,0 +1,406 @@
+"""命令行入口：droidcamserver <command>
+
+cv2 / numpy 只在需要的子命令里导入，管理类命令（config、segments、notify）不加载视觉依赖。
+"""
+import sys
+import json
+import logging
+import argparse
+from datetime import datetime, timedelta
+
+from .config import default_config_path, load_config
+
+
+def _storage(args, config):
+    return args.directory or config().cam.storage_path
+
+
+def cmd_run(args, config):
+    from .monitor import run
+    run(config())
+
+
+def cmd_preview(args, config):
+    from .preview import preview
+    url = args.url or config().cam.source_url
+    preview(url, args.output, args.display_fps, args.width, args.queue, not args.no_window, args.timeout)
+
+
+def cmd_reanalyze(args, config):
+    from .reanalyze import reanalyze, recorded_seconds
+    params = dict(alpha=args.alpha, blur=args.blur, threshold=args.threshold, min_area=args.min_area)
+    stabilize = dict(budget_ms=args.shake_budget_ms)
+    directory = _storage(args, config)
+    if not args.compare_stabilize:
+        for path, fps, frames, seconds, events in reanalyze(directory, params, args.step, args.hold, args.workers,
+                                                               stabilize if args.stabilize else None):
+            print(json.dumps(dict(file=path, fps=fps, frames=frames, seconds=round(seconds, 2), events=events)))
+        return
+
+    # 同一批文件分别不补偿 / 补偿各跑一遍，比较会录下的秒数
+    raw = reanalyze(directory, params, args.step, args.hold, args.workers)
+    stable = {r[0]: r for r in reanalyze(directory, params, args.step, args.hold, args.workers, stabilize)}
+    total_raw = total_stable = 0.0
+    for path, fps, frames, duration, events in raw:
+        if path not in stable:
+            continue
+        before = recorded_seconds(events, duration, args.hold)
+        after = recorded_seconds(stable[path][4], duration, args.hold)
+        total_raw += before
+        total_stable += after
+        print(json.dumps(dict(file=path, seconds=round(duration, 1), recorded=round(before, 1),
+                              recorded_stabilized=round(after, 1))))
+    removed = total_raw - total_stable
+    print(f"recorded {total_raw:.1f}s without compensation, {total_stable:.1f}s with; "
+          f"removed {removed:.1f}s ({removed / total_raw * 100 if total_raw else 0.0:.1f}%)")
+
+
+def cmd_summarize(args, config):
+    import os
+    from .summarize import summarize
+    directory = _storage(args, config)
+    output = args.output or os.path.join(directory, f"summary_{args.day}.avi")
+    summarize(directory, args.day, output, args.fps, max(args.idle_step, 1), args.hold, args.workers)
+
+
+def cmd_bench(args, config):
+    from .bench import bench_detector, file_frames, synthetic_frames
+    if args.file:
+        frames = file_frames(args.file, args.frames)
+    else:
+        w, h = (int(v) for v in args.size.lower().split('x'))
+        frames = synthetic_frames(args.frames, (w, h))
+    count, elapsed, motion_frames = bench_detector(frames)
+    print(f"{count} frames in {elapsed:.3f}s: {count / elapsed:.1f} fps, "
+          f"{elapsed / max(count, 1) * 1000:.2f} ms/frame, {motion_frames} motion frames")
+
+
+def cmd_soak(args, config):
+    from .bench import soak
+    w, h = (int(v) for v in args.size.lower().split('x'))
+    growth, ok = soak(args.frames, (w, h), args.limit_mb, args.gc_policy)
+    return 0 if ok else 1
+
+
+def cmd_bus_watch(args, config):
+    import time
+    from .framebus import FrameReader
+    reader = FrameReader(args.camera or config().cam.camera_name)
+    start = time.monotonic()
+    frames = 0
+    try:
+        while time.monotonic() - start < args.seconds:
+            if reader.read(timeout=1.0) is not None:
+                frames += 1
+    finally:
+        elapsed = time.monotonic() - start
+        print(f"{frames} frames in {elapsed:.1f}s ({frames / elapsed:.1f} fps), "
+              f"dropped {reader.dropped}, lag {reader.lag()}, slots {reader.slots}, shape {reader.shape}")
+        reader.close()
+
+
+def cmd_index_query(args, config):
+    from .timeline import day_stats, load_range
+    cam = config().cam
+    end = datetime.strptime(args.day, "%Y%m%d")
+    days = [(end - timedelta(days=i)).strftime("%Y%m%d") for i in reversed(range(args.days))]
+    records = load_range(args.storage or cam.storage_path, args.camera or cam.camera_name, days)
+    print(json.dumps(dict(days=[days[0], days[-1]], **day_stats(records, args.min_area))))
+
+
+def cmd_load_status(args, config):
+    import os
+    from .overload import STATE_FILE
+    path = os.path.join(_storage(args, config), STATE_FILE)
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"No load state at {path} (is [runtime] overload_control enabled?)")
+    if args.history:
+        for change in state['changes']:
+            print(f"{datetime.fromtimestamp(change['ts']):%Y-%m-%d %H:%M:%S}\t{change['previous']} -> {change['name']}"
+                  f"\tbusy {change['busy']:.2f} write {change['write']:.2f} cpu {change['cpu']:.2f}")
+        return
+    state.pop('changes')
+    print(json.dumps(state))
+
+
+def cmd_segments_list(args, config):
+    from .segments import list_segments
+    for path, start, is_cont in list_segments(_storage(args, config), args.day):
+        print(f"{start:%Y-%m-%d %H:%M:%S}\t{'cont' if is_cont else 'event'}\t{path}")
+
+
+def cmd_segments_index(args, config):
+    from .seekindex import backfill
+    built, failed = backfill(_storage(args, config), args.force)
+    print(f"indexed {built} segments, {failed} failed")
+    return 1 if failed else 0
+
+
+def cmd_segments_export(args, config):
+    import os
+    from .segments import parse_segment_name
+    from .seekindex import build_index, export, load_index
+    spec = args.at
+    if spec.startswith('+'):
+        # 相对片段首帧采集时间的偏移（秒）
+        index = load_index(args.file)
+        if index is None:
+            index = build_index(args.file)
+        if not len(index):
+            raise ValueError(f"{args.file} has no frames")
+        ts = float(index['ts'][0]) + float(spec[1:])
+    elif len(spec) == 14 and spec.isdigit():
+        ts = datetime.strptime(spec, "%Y%m%d%H%M%S").timestamp()
+    else:
+        parsed = parse_segment_name(args.file)
+        if parsed is None:
+            raise ValueError(f"Cannot tell the date of {args.file}; use YYYYmmddHHMMSS or +SECONDS")
+        clock = datetime.strptime(spec, "%H:%M:%S").time()
+        ts = datetime.combine(parsed[0].date(), clock).timestamp()
+    count = export(args.file, args.output, ts, args.seconds)
+    print(f"exported {count} frames to {os.path.abspath(args.output)}")
+
+
+def cmd_serve(args, config):
+    from .server import serve
+    serve(_storage(args, config), args.host, args.port)
+
+
+def cmd_upload_pending(args, config):
+    from .upload import S3Uploader
+    c = config()
+    if not c.upload.bucket:
+        raise ValueError("No [upload] bucket configured")
+    uploader = S3Uploader(c.upload, c.cam.storage_path)
+    try:
+        failed = 0
+        for path in uploader.pending():
+            if args.dry_run:
+                print(path)
+                continue
+            try:
+                uploader.upload(path)
+            except Exception as e:
+                logging.error(f"Upload failed for {path}: {e}")
+                failed += 1
+        return 1 if failed else 0
+    finally:
+        uploader.close()
+
+
+def cmd_upload_status(args, config):
+    import os
+    from .upload import STATE_FILE, UploadState
+    state = UploadState(os.path.join(config().cam.storage_path, STATE_FILE))
+    print(json.dumps(state.counts()))
+
+
+def cmd_compact_now(args, config):
+    import dataclasses
+    import os
+    from .compact import Compactor
+    c = config()
+    settings = c.compact
+    settings = dataclasses.replace(settings, workers=args.workers or max(settings.workers, 1),
+                                   min_age_minutes=args.min_age if args.min_age is not None else settings.min_age_minutes)
+    directory = _storage(args, config)
+    uploads = None
+    if c.upload.bucket:
+        from .upload import STATE_FILE, UploadState
+        uploads = UploadState(os.path.join(directory, STATE_FILE))
+    done, reclaimed = Compactor(settings, directory, uploads=uploads).drain(args.limit)
+    logging.info(f"Compacted {done} segments, reclaimed {reclaimed / 1048576:.1f} MB")
+
+
+def cmd_compact_status(args, config):
+    import os
+    from .compact import STATE_FILE, CompactState
+    totals = CompactState(os.path.join(_storage(args, config), STATE_FILE)).totals()
+    done = totals.get('done', dict(old_bytes=0, new_bytes=0))
+    totals['reclaimed_mb'] = round((done['old_bytes'] - done['new_bytes']) / 1048576, 1)
+    print(json.dumps(totals))
+
+
+def cmd_notify_test(args, config):
+    from .notify import send_mail
+    mail = config().mail
+    if mail is None:
+        raise ValueError("No [mail_setting] section in config")
+    send_mail(mail, "droidcamserver test", "This is a test message from droidcamserver", args.attach)
+    logging.info(f"Test mail sent to {mail.receiver_email}")
+
+
+def cmd_config_show(args, config):
+    c = config()
+    print(f"config: {c.path}")
+    print(f"camera: {c.cam.camera_name} ({c.cam.camip})")
+    print(f"storage_path: {c.cam.storage_path}")
+    print(f"static_threshold: {c.cam.static_threshold}, min_record_fps: {c.cam.min_record_fps}")
+    print(f"mail: {'configured' if c.mail else 'not configured'}")
+    print(f"shake compensation: {'on, budget %g ms/frame' % c.cam.stabilize_budget_ms if c.cam.stabilize else 'off'}")
+    if c.archive.fps > 0:
+        print(f"archive: {c.archive.width}px @ {c.archive.fps:g} fps, keep {c.archive.retention_days:g} days")
+    else:
+        print("archive: off")
+    k = c.compact
+    if k.workers > 0:
+        print(f"compaction: {k.fourcc} x{k.scale:g}, {k.workers} workers at nice {k.nice}, "
+              f"{'hours ' + k.hours + ' or ' if k.hours else ''}idle below {k.idle_load:g}")
+    else:
+        print("compaction: off")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='droidcamserver', description="DroidCam motion recording server")
+    parser.add_argument('--config', default=default_config_path(),
+                        help="path to private_config.txt (default: $DROIDCAMSERVER_CONFIG or %(default)s)")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('run', help="connect to the camera and record on motion")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser('preview', help="live preview that records every frame (capture/display/write in separate threads)")
+    p.add_argument('url', nargs='?', help="stream URL, defaults to the configured camera")
+    p.add_argument('--output', default='output.avi')
+    p.add_argument('--display-fps', type=float, default=15.0, help="preview refresh rate, independent of capture")
+    p.add_argument('--width', type=int, default=640, help="downscale the preview to this width (0 = full size)")
+    p.add_argument('--queue', type=int, default=120, help="frames buffered for the writer before dropping")
+    p.add_argument('--timeout', type=float, default=10.0, help="stream open/read timeout in seconds")
+    p.add_argument('--no-window', action='store_true', help="record only, log stats instead of showing a window")
+    p.set_defaults(func=cmd_preview)
+
+    p = sub.add_parser('reanalyze', help="re-run detection over recorded segments")
+    p.add_argument('directory', nargs='?', help="defaults to storage_path")
+    p.add_argument('--alpha', type=float, default=0.05)
+    p.add_argument('--blur', type=int, default=21)
+    p.add_argument('--threshold', type=int, default=30)
+    p.add_argument('--min-area', type=int, default=8000)
+    p.add_argument('--step', type=int, default=1, help="analyze every Nth frame")
+    p.add_argument('--hold', type=float, default=10.0, help="merge detections closer than this many seconds")
+    p.add_argument('--workers', type=int)
+    p.add_argument('--stabilize', action='store_true', help="compensate global camera shake before differencing")
+    p.add_argument('--shake-budget-ms', type=float, default=2.0, help="average time budget per frame for compensation")
+    p.add_argument('--compare-stabilize', action='store_true',
+                   help="run with and without compensation and report the recording seconds it removes")
+    p.set_defaults(func=cmd_reanalyze)
+
+    p = sub.add_parser('summarize', help="build a condensed daily summary video")
+    p.add_argument('directory', nargs='?', help="defaults to storage_path")
+    p.add_argument('--day', default=datetime.now().strftime("%Y%m%d"), help="YYYYmmdd")
+    p.add_argument('--output')
+    p.add_argument('--fps', type=float, default=20.0)
+    p.add_argument('--idle-step', type=int, default=40, help="keep one of every N idle frames")
+    p.add_argument('--hold', type=float, default=2.0, help="seconds kept at full rate after motion")
+    p.add_argument('--workers', type=int)
+    p.set_defaults(func=cmd_summarize)
+
+    p = sub.add_parser('bench', help="measure detection throughput")
+    p.add_argument('--file', help="video file to use instead of synthetic frames")
+    p.add_argument('--frames', type=int, default=500)
+    p.add_argument('--size', default='640x480')
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser('soak', help="replay frames and check that memory stays flat")
+    p.add_argument('--frames', type=int, default=100000)
+    p.add_argument('--size', default='320x240')
+    p.add_argument('--limit-mb', type=float, default=20.0, help="allowed RSS growth after warm-up")
+    p.add_argument('--gc-policy', default='freeze', choices=('auto', 'freeze', 'manual'))
+    p.set_defaults(func=cmd_soak)
+
+    bus = sub.add_parser('bus', help="shared-memory frame bus").add_subparsers(dest='action', required=True)
+    p = bus.add_parser('watch', help="attach as a reader and report rate and drops")
+    p.add_argument('--camera')
+    p.add_argument('--seconds', type=float, default=10.0)
+    p.set_defaults(func=cmd_bus_watch)
+
+    index = sub.add_parser('index', help="per-frame motion timeline").add_subparsers(dest='action', required=True)
+    p = index.add_parser('query', help="summarize the timeline over a range of days")
+    p.add_argument('--day', default=datetime.now().strftime("%Y%m%d"), help="last day, YYYYmmdd")
+    p.add_argument('--days', type=int, default=1)
+    p.add_argument('--camera')
+    p.add_argument('--storage')
+    p.add_argument('--min-area', type=int, default=8000)
+    p.set_defaults(func=cmd_index_query)
+
+    load = sub.add_parser('load', help="overload controller state").add_subparsers(dest='action', required=True)
+    p = load.add_parser('status', help="current degradation level and load signals")
+    p.add_argument('directory', nargs='?', help="defaults to storage_path")
+    p.add_argument('--history', action='store_true', help="list recent level changes instead")
+    p.set_defaults(func=cmd_load_status)
+
+    segments = sub.add_parser('segments', help="recorded segments").add_subparsers(dest='action', required=True)
+    p = segments.add_parser('list')
+    p.add_argument('directory', nargs='?', help="defaults to storage_path")
+    p.add_argument('--day', help="YYYYmmdd")
+    p.set_defaults(func=cmd_segments_list)
+    p = segments.add_parser('index', help="build missing keyframe seek indexes (.idx) for existing segments")
+    p.add_argument('directory', nargs='?', help="defaults to storage_path, subdirectories included")
+    p.add_argument('--force', action='store_true', help="rebuild existing indexes too")
+    p.set_defaults(func=cmd_segments_index)
+    p = segments.add_parser('export', help="export a frame or a clip starting at a capture time")
+    p.add_argument('file')
+    p.add_argument('--at', required=True, help="HH:MM:SS, YYYYmmddHHMMSS or +SECONDS from the first frame")
+    p.add_argument('--seconds', type=float, default=10.0, help="clip length (ignored for .jpg/.png output)")
+    p.add_argument('--output', required=True, help=".avi for a clip, .jpg/.png for a single frame")
+    p.set_defaults(func=cmd_segments_export)
+
+    p = sub.add_parser('serve', help="serve events, playlists and segments over HTTP")
+    p.add_argument('directory', nargs='?', help="defaults to storage_path")
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8088)
+    p.set_defaults(func=cmd_serve)
+
+    upload = sub.add_parser('upload', help="off-box copies in S3-compatible storage").add_subparsers(dest='action', required=True)
+    p = upload.add_parser('pending', help="upload (or resume) every segment not uploaded yet")
+    p.add_argument('--dry-run', action='store_true')
+    p.set_defaults(func=cmd_upload_pending)
+    p = upload.add_parser('status', help="count uploads by state")
+    p.set_defaults(func=cmd_upload_status)
+
+    compact = sub.add_parser('compact', help="re-encode closed segments to a smaller codec").add_subparsers(dest='action', required=True)
+    p = compact.add_parser('now', help="compact every eligible segment now, ignoring hours and idle checks")
+    p.add_argument('directory', nargs='?', help="storage directory (default: storage_path from config)")
+    p.add_argument('--workers', type=int, default=0, help="parallel transcoders (default: config, at least 1)")
+    p.add_argument('--limit', type=int, default=None, help="stop after this many segments")
+    p.add_argument('--min-age', type=float, default=None, help="minimum minutes since a segment closed")
+    p.set_defaults(func=cmd_compact_now)
+    p = compact.add_parser('status', help="segments compacted and space reclaimed")
+    p.add_argument('directory', nargs='?', help="storage directory (default: storage_path from config)")
+    p.set_defaults(func=cmd_compact_status)
+
+    notify = sub.add_parser('notify', help="mail notifications").add_subparsers(dest='action', required=True)
+    p = notify.add_parser('test', help="send a test mail")
+    p.add_argument('--attach')
+    p.set_defaults(func=cmd_notify_test)
+
+    cfg = sub.add_parser('config', help="configuration").add_subparsers(dest='action', required=True)
+    p = cfg.add_parser('show')
+    p.set_defaults(func=cmd_config_show)
+
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(
+        stream=sys.stdout,
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%d-%b-%y %H:%M:%S'
+    )
+    args = build_parser().parse_args(argv)
+
+    # 配置只在第一次需要时加载一次
+    loaded = []
+    def config():
+        if not loaded:
+            loaded.append(load_config(args.config))
+        return loaded[0]
+
+    try:
+        return args.func(args, config) or 0
+    except ValueError as e:
+        logging.error(str(e))
+        return 1
@@ -0,0 +1,341 @@
+"""延迟压缩：在夜间或空闲时把已关闭的片段转码为更紧凑的编码，校验后原地原子替换
+
+- 候选：已关闭（已写出 .ts 旁路文件）、超过 min_age 且尚未处理过的片段，含 archive 等子目录，按时间先后；
+  启用上传时，存储目录下的片段要等上传完成（且之后未变化）才压缩，避免分片上传中途换了文件
+- 转码在低优先级（nice）子进程中进行，每个片段一个进程，最多 workers 个并行
+- 只在配置的时段内，或系统空闲（扣除自身进程后的 1 分钟负载/核数低于 idle_load）时运行
+- 实时录制需要 CPU（正在录制或过载降级）时立即向转码进程发送 SIGSTOP，条件解除后 SIGCONT 继续
+- 校验帧数与 .ts 记录、名义时长一致且末帧可解码后，os.replace 原子替换，并同步替换定位索引
+- 每个片段的原大小、新大小与耗时记录在 storage_path/compact_state.sqlite
+
+转码器只用 OpenCV 自带的 FFmpeg 编码器；VP9（fourcc VP90）放在 AVI 容器里，文件名与下游工具都不变。
+cv2 / numpy 只在转码与校验时导入，compact status 只读 sqlite。
+"""
+import os
+import time
+import signal
+import sqlite3
+import logging
+import threading
+import multiprocessing as mp
+from datetime import datetime
+
+from .segments import SEGMENT_RE, index_path, timestamps_path
+
+STATE_FILE = 'compact_state.sqlite'
+_TMP_SUFFIX = '.compact.avi'
+
+
+def parse_hours(spec):
+    """'1-6' 或 '22-6'（跨零点）-> (开始小时, 结束小时)；空字符串表示不按时段，只看空闲"""
+    if not spec:
+        return None
+    start, end = (int(v) for v in spec.split('-'))
+    if not (0 <= start <= 23 and 0 <= end <= 24):
+        raise ValueError(f"invalid compaction hours {spec!r}")
+    return start, end
+
+
+def in_hours(hours, now=None):
+    if hours is None:
+        return False
+    hour = (now or datetime.now()).hour
+    start, end = hours
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+def transcode(src, dst, fourcc, scale, nice):
+    """子进程入口：降低优先级后逐帧转码，成功时退出码为 0"""
+    import cv2
+    try:
+        os.nice(nice)
+    except (AttributeError, OSError):
+        pass
+    cv2.setNumThreads(1)
+    video = cv2.VideoCapture(src)
+    out = None
+    try:
+        fps = video.get(cv2.CAP_PROP_FPS) or 20.0
+        while True:
+            check, frame = video.read()
+            if not check:
+                break
+            if scale != 1.0:
+                h, w = frame.shape[:2]
+                frame = cv2.resize(frame, (round(w * scale / 2) * 2, round(h * scale / 2) * 2),
+                                   interpolation=cv2.INTER_AREA)
+            if out is None:
+                out = cv2.VideoWriter(dst, cv2.VideoWriter_fourcc(*fourcc), fps, (frame.shape[1], frame.shape[0]))
+                if not out.isOpened():
+                    raise SystemExit(2)
+            out.write(frame)
+    finally:
+        video.release()
+        if out is not None:
+            out.release()
+    if out is None:
+        raise SystemExit(1)
+
+
+class CompactState:
+    """持久化压缩记录；sqlite 连接按线程各自打开"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._db() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS segments (
+                path TEXT PRIMARY KEY, status TEXT, old_size INTEGER, new_size INTEGER,
+                seconds REAL, updated REAL)""")
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            self._local.db = db
+        return db
+
+    def seen(self, path):
+        return self._db().execute("SELECT 1 FROM segments WHERE path = ?", (path,)).fetchone() is not None
+
+    def record(self, path, status, old_size, new_size, seconds):
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?, ?, ?)",
+                       (path, status, old_size, new_size, seconds, time.time()))
+
+    def totals(self):
+        rows = self._db().execute(
+            "SELECT status, COUNT(*), SUM(old_size), SUM(new_size), SUM(seconds) FROM segments GROUP BY status")
+        return {status: dict(files=n, old_bytes=old or 0, new_bytes=new or 0, seconds=round(sec or 0.0, 1))
+                for status, n, old, new, sec in rows}
+
+
+class Compactor(threading.Thread):
+    """后台调度线程：set_busy() 由录制主循环每帧调用，忙闲不变时没有开销
+
+    _busy、_paused 与 _jobs 的变化都在 _lock 下进行：调度线程恢复或启动转码时重新检查 _busy，
+    录制开始后不会有转码进程继续运行。
+    """
+
+    def __init__(self, settings, storage_path, poll=5.0, uploads=None):
+        super().__init__(name='compactor', daemon=True)
+        self.settings = settings
+        self.storage_path = storage_path
+        # 上传状态（upload.UploadState），None 表示未启用上传
+        self.uploads = uploads
+        self.poll = poll
+        self.hours = parse_hours(settings.hours)
+        self.state = CompactState(os.path.join(storage_path, STATE_FILE))
+        self._ctx = mp.get_context('spawn')
+        self._jobs = {}  # path -> (Process, 开始时间)
+        self._lock = threading.Lock()
+        self._busy = False
+        self._paused = False
+        self._halt = threading.Event()
+
+    def set_busy(self, busy):
+        if busy == self._busy:
+            return
+        with self._lock:
+            self._busy = busy
+            if busy:
+                self._pause_locked()
+
+    def _signal(self, sig, procs=None):
+        for proc in procs if procs is not None else [p for p, _ in self._jobs.values()]:
+            try:
+                os.kill(proc.pid, sig)
+            except (OSError, TypeError):
+                pass
+
+    def _pause_locked(self):
+        if self._paused or not self._jobs:
+            return
+        self._signal(signal.SIGSTOP)
+        self._paused = True
+        logging.info(f"Compaction paused ({len(self._jobs)} jobs)")
+
+    def _pause(self):
+        with self._lock:
+            self._pause_locked()
+
+    def _resume(self):
+        with self._lock:
+            if not self._paused or self._busy:
+                return
+            self._signal(signal.SIGCONT)
+            self._paused = False
+            logging.info(f"Compaction resumed ({len(self._jobs)} jobs)")
+
+    def allowed(self):
+        if self._busy:
+            return False
+        if in_hours(self.hours):
+            return True
+        if not hasattr(os, 'getloadavg'):
+            return False
+        # 扣除自身转码进程贡献的负载
+        cores = os.cpu_count() or 1
+        running = 0 if self._paused else len(self._jobs)
+        return (os.getloadavg()[0] - running) / cores < self.settings.idle_load
+
+    def candidates(self):
+        """按时间先后返回待压缩的片段路径"""
+        cutoff = time.time() - self.settings.min_age_minutes * 60
+        found = []
+        for root, dirs, files in os.walk(self.storage_path):
+            for name in files:
+                if not SEGMENT_RE.match(name):
+                    continue
+                path = os.path.join(root, name)
+                if path in self._jobs or not os.path.exists(timestamps_path(path)):
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if st.st_mtime > cutoff:
+                    continue
+                # 只有存储目录顶层的事件片段会上传
+                if self.uploads is not None and root == self.storage_path and not self.uploads.is_done(path, st):
+                    continue
+                found.append((name, path))
+        found.sort()
+        return [path for _, path in found if not self.state.seen(path)]
+
+    def _start(self, path):
+        s = self.settings
+        proc = self._ctx.Process(target=transcode, args=(path, path + _TMP_SUFFIX, s.fourcc, s.scale, s.nice),
+                                 name=f"compact-{os.path.basename(path)}", daemon=True)
+        proc.start()
+        with self._lock:
+            self._jobs[path] = (proc, time.monotonic())
+            # 启动期间录制已经开始：立即停下新进程
+            if self._busy or self._paused:
+                self._signal(signal.SIGSTOP, [proc])
+                self._paused = True
+
+    def _reap(self):
+        for path, (proc, started) in list(self._jobs.items()):
+            if proc.is_alive():
+                continue
+            proc.join()
+            with self._lock:
+                del self._jobs[path]
+            self.finish(path, proc.exitcode, time.monotonic() - started)
+
+    def finish(self, path, exitcode, seconds):
+        """校验转码结果并原子替换，返回回收的字节数"""
+        tmp = path + _TMP_SUFFIX
+        old_size = 0
+        try:
+            # 源文件可能已被存档清理删除
+            old_size = os.path.getsize(path)
+            if exitcode != 0:
+                raise ValueError(f"transcoder exited with {exitcode}")
+            ok, reason = verify(path, tmp)
+            if not ok:
+                raise ValueError(reason)
+            new_size = os.path.getsize(tmp)
+            if new_size >= old_size:
+                self.state.record(path, 'larger', old_size, new_size, seconds)
+                logging.info(f"Compaction of {path} saved nothing ({new_size} >= {old_size} bytes), kept original")
+                return 0
+            os.replace(tmp, path)
+            os.replace(index_path(tmp), index_path(path))
+        except (OSError, ValueError) as e:
+            self.state.record(path, 'failed', old_size, 0, seconds)
+            logging.error(f"Compaction of {path} failed: {e}")
+            return 0
+        finally:
+            for p in (tmp, index_path(tmp)):
+                if os.path.exists(p):
+                    os.remove(p)
+        self.state.record(path, 'done', old_size, new_size, seconds)
+        logging.info(f"Compacted {path}: {old_size / 1048576:.1f} -> {new_size / 1048576:.1f} MB in {seconds:.0f}s")
+        return old_size - new_size
+
+    def cleanup(self):
+        """删除上次中断留下的临时文件"""
+        for root, dirs, files in os.walk(self.storage_path):
+            for name in files:
+                if name.endswith(_TMP_SUFFIX) or name.endswith('.compact.idx'):
+                    os.remove(os.path.join(root, name))
+
+    def run(self):
+        self.cleanup()
+        while not self._halt.wait(self.poll):
+            try:
+                self._reap()
+                if not self.allowed():
+                    self._pause()
+                    continue
+                self._resume()
+                if len(self._jobs) >= self.settings.workers:
+                    continue
+                for path in self.candidates()[:self.settings.workers - len(self._jobs)]:
+                    if self._busy:
+                        break
+                    self._start(path)
+            except Exception as e:
+                logging.error(f"Compaction scheduler error: {e}")
+
+    def drain(self, limit=None):
+        """前台一次性处理所有候选（不看时段与空闲），返回 (处理数, 回收字节数)"""
+        self.cleanup()
+        queue = self.candidates()[:limit]
+        done = reclaimed = 0
+        while queue or self._jobs:
+            while queue and len(self._jobs) < max(self.settings.workers, 1):
+                self._start(queue.pop(0))
+            time.sleep(0.2)
+            for path, (proc, started) in list(self._jobs.items()):
+                if proc.is_alive():
+                    continue
+                proc.join()
+                with self._lock:
+                    del self._jobs[path]
+                reclaimed += self.finish(path, proc.exitcode, time.monotonic() - started)
+                done += 1
+        return done, reclaimed
+
+    def stop(self):
+        self._halt.set()
+        if self.is_alive():
+            self.join(self.poll + 1.0)
+        with self._lock:
+            self._signal(signal.SIGCONT)
+            jobs = list(self._jobs.items())
+            self._jobs.clear()
+        for path, (proc, _) in jobs:
+            proc.terminate()
+            proc.join()
+            for p in (path + _TMP_SUFFIX, index_path(path + _TMP_SUFFIX)):
+                if os.path.exists(p):
+                    os.remove(p)
+
+
+def verify(src, dst):
+    """转码结果与原片段帧数、名义时长一致，且末帧可解码；同时为 dst 生成定位索引"""
+    import cv2
+    from .recorder import load_timestamps
+    from .seekindex import build_index, open_at, scan_avi
+    timestamps = load_timestamps(src) if os.path.exists(timestamps_path(src)) else None
+    expected = len(timestamps) if timestamps is not None else len(scan_avi(src)[0])
+    index = build_index(dst, timestamps)
+    if len(index) != expected:
+        return False, f"frame count {len(index)} != {expected}"
+    a, b = cv2.VideoCapture(src), cv2.VideoCapture(dst)
+    fps_a, fps_b = a.get(cv2.CAP_PROP_FPS) or 20.0, b.get(cv2.CAP_PROP_FPS) or 20.0
+    a.release()
+    b.release()
+    if abs(expected / fps_a - len(index) / fps_b) > 1.0 / fps_a:
+        return False, f"duration {len(index) / fps_b:.2f}s != {expected / fps_a:.2f}s"
+    if expected:
+        video = open_at(dst, expected - 1, index)
+        check = video.read()[0]
+        video.release()
+        if not check:
+            return False, "last frame does not decode"
+    return True, ''
+
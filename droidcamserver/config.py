@@ -0,0 +1,269 @@
+"""配置加载：private_config.txt 只在启动时按显式路径读取一次，得到类型化的不可变对象
+
+config file looks like:
+[mail_setting]
+sender_email = xxxx
+receiver_email = xxxx
+password = xxxxx
+smtp_ssl_server = smtp.163.com
+[cam_setting]
+droidcampass = username:passwd
+camip = 1.1.1.1
+storage_path = /xxxx/xxxxxx/xxx
+stabilize = no
+[runtime]                 (optional)
+gc_policy = freeze
+gc_threshold = 700,10,10
+memory_interval = 60
+memory_warn_mb = 200
+tracemalloc_frames = 0
+frame_bus_slots = 8
+background_checkpoint = 60
+background_tolerance = 12
+read_timeout = 10
+trace_spans = 0
+overload_control = no
+overload_high = 0.85
+overload_low = 0.6
+[verify]                  (optional)
+mode = hog
+workers = 2
+max_latency = 0.5
+fail_open = yes
+[upload]                  (optional, needs boto3)
+endpoint = http://127.0.0.1:9000
+bucket = droidcam
+prefix = cam1
+access_key = xxxx
+secret_key = xxxx
+workers = 4
+part_size_mb = 8
+max_mbps = 0
+[archive]                 (optional)
+fps = 2
+width = 320
+retention_days = 7
+[compact]                 (optional)
+workers = 1
+fourcc = VP90
+scale = 1.0
+hours = 1-6
+idle_load = 0.25
+nice = 19
+min_age_minutes = 30
+"""
+import os
+import configparser
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.expanduser('~'), '.config', 'droidcamserver', 'private_config.txt')
+
+
+@dataclass(frozen=True)
+class MailSettings:
+    sender_email: str
+    receiver_email: str
+    password: str
+    smtp_ssl_server: str
+
+
+@dataclass(frozen=True)
+class CamSettings:
+    droidcampass: str
+    camip: str
+    storage_path: str
+    # 静止帧抑制：与上一写入帧的平均像素差低于阈值时跳过，但不低于 min_record_fps
+    static_threshold: float = 2.0
+    min_record_fps: float = 2.0
+    # 差分前的全局抖动补偿（见 stabilize.py）及其每帧平均耗时上限（毫秒）
+    stabilize: bool = False
+    stabilize_budget_ms: float = 2.0
+
+    @property
+    def camera_name(self):
+        return self.camip.replace('.', '_').replace(':', '_')
+
+    @property
+    def source_url(self):
+        return f'http://{self.droidcampass}@{self.camip}:4747/video'
+
+
+@dataclass(frozen=True)
+class RuntimeSettings:
+    # GC 策略：auto / freeze / manual，见 memwatch.apply_gc_policy
+    gc_policy: str = 'freeze'
+    gc_threshold: Optional[Tuple[int, int, int]] = None
+    # 内存采样间隔（秒）、增长告警阈值（MB）、tracemalloc 保留的栈深度（0 关闭）
+    memory_interval: float = 60.0
+    memory_warn_mb: float = 200.0
+    tracemalloc_frames: int = 0
+    # 共享内存帧总线的槽数（0 关闭），供其它进程零拷贝读取实时帧
+    frame_bus_slots: int = 0
+    # 背景模型检查点间隔（秒，0 关闭）与恢复时允许的平均灰度差
+    background_checkpoint: float = 60.0
+    background_tolerance: float = 12.0
+    # 打开/读取视频流的超时（秒），避免 video.read() 永久阻塞
+    read_timeout: float = 10.0
+    # 逐帧阶段追踪的环形缓冲容量（span 数，0 关闭）；SIGUSR1 或退出时导出 Chrome trace
+    trace_spans: int = 0
+    # 过载控制（见 overload.py）：负载信号高于 high 时逐级降级，低于 low 时逐级恢复
+    overload_control: bool = False
+    overload_high: float = 0.85
+    overload_low: float = 0.6
+
+
+@dataclass(frozen=True)
+class VerifySettings:
+    # 二级确认：none 关闭；hog 在运动外接框上跑 HOG 行人检测
+    mode: str = 'none'
+    workers: int = 2
+    # 最长等待确认的时间（秒），超时按 fail_open 放行或丢弃
+    max_latency: float = 0.5
+    fail_open: bool = True
+    hit_threshold: float = 0.0
+
+
+@dataclass(frozen=True)
+class UploadSettings:
+    # bucket 为空时不上传
+    bucket: str = ''
+    endpoint: str = ''
+    region: str = ''
+    prefix: str = ''
+    access_key: str = ''
+    secret_key: str = ''
+    workers: int = 4
+    part_size_mb: float = 8.0
+    # 上传限速（Mbit/s），0 不限
+    max_mbps: float = 0.0
+
+
+@dataclass(frozen=True)
+class ArchiveSettings:
+    # 连续存档帧率，0 关闭；width 为存档宽度（像素，等比缩放）；retention_days 为保留天数，0 不清理
+    fps: float = 0.0
+    width: int = 320
+    retention_days: float = 7.0
+
+
+@dataclass(frozen=True)
+class CompactSettings:
+    # 延迟压缩（见 compact.py）：workers 为 0 时关闭；hours 如 1-6 或 22-6，为空时只在空闲时运行
+    workers: int = 0
+    fourcc: str = 'VP90'
+    scale: float = 1.0
+    hours: str = ''
+    # 空闲判定：1 分钟负载/核数低于该值（扣除转码进程自身）
+    idle_load: float = 0.25
+    nice: int = 19
+    # 片段关闭后至少等待的分钟数，给上传和人工查看留出时间
+    min_age_minutes: float = 30.0
+
+
+@dataclass(frozen=True)
+class Config:
+    path: str
+    cam: CamSettings
+    mail: Optional[MailSettings] = None
+    runtime: RuntimeSettings = RuntimeSettings()
+    verify: VerifySettings = VerifySettings()
+    upload: UploadSettings = UploadSettings()
+    archive: ArchiveSettings = ArchiveSettings()
+    compact: CompactSettings = CompactSettings()
+
+
+def default_config_path():
+    return os.environ.get('DROIDCAMSERVER_CONFIG', DEFAULT_CONFIG_PATH)
+
+
+def load_config(path=None):
+    """读取配置文件；缺少必填项时抛出 ValueError"""
+    path = os.path.abspath(path or default_config_path())
+    parser = configparser.ConfigParser()
+    try:
+        with open(path, 'r') as f:
+            parser.read_file(f)
+    except OSError as e:
+        raise ValueError(f"Cannot read config {path}: {e}") from e
+
+    try:
+        cam = CamSettings(
+            droidcampass=parser.get('cam_setting', 'droidcampass'),
+            camip=parser.get('cam_setting', 'camip'),
+            storage_path=parser.get('cam_setting', 'storage_path'),
+            static_threshold=parser.getfloat('cam_setting', 'static_threshold', fallback=2.0),
+            min_record_fps=parser.getfloat('cam_setting', 'min_record_fps', fallback=2.0),
+            stabilize=parser.getboolean('cam_setting', 'stabilize', fallback=False),
+            stabilize_budget_ms=parser.getfloat('cam_setting', 'stabilize_budget_ms', fallback=2.0),
+        )
+        mail = None
+        if parser.has_section('mail_setting'):
+            mail = MailSettings(
+                sender_email=parser.get('mail_setting', 'sender_email'),
+                receiver_email=parser.get('mail_setting', 'receiver_email'),
+                password=parser.get('mail_setting', 'password'),
+                smtp_ssl_server=parser.get('mail_setting', 'smtp_ssl_server'),
+            )
+        threshold = parser.get('runtime', 'gc_threshold', fallback='')
+        runtime = RuntimeSettings(
+            gc_policy=parser.get('runtime', 'gc_policy', fallback='freeze'),
+            gc_threshold=tuple(int(v) for v in threshold.split(',')) if threshold else None,
+            memory_interval=parser.getfloat('runtime', 'memory_interval', fallback=60.0),
+            memory_warn_mb=parser.getfloat('runtime', 'memory_warn_mb', fallback=200.0),
+            tracemalloc_frames=parser.getint('runtime', 'tracemalloc_frames', fallback=0),
+            frame_bus_slots=parser.getint('runtime', 'frame_bus_slots', fallback=0),
+            background_checkpoint=parser.getfloat('runtime', 'background_checkpoint', fallback=60.0),
+            background_tolerance=parser.getfloat('runtime', 'background_tolerance', fallback=12.0),
+            read_timeout=parser.getfloat('runtime', 'read_timeout', fallback=10.0),
+            trace_spans=parser.getint('runtime', 'trace_spans', fallback=0),
+            overload_control=parser.getboolean('runtime', 'overload_control', fallback=False),
+            overload_high=parser.getfloat('runtime', 'overload_high', fallback=0.85),
+            overload_low=parser.getfloat('runtime', 'overload_low', fallback=0.6),
+        )
+        verify = VerifySettings(
+            mode=parser.get('verify', 'mode', fallback='none'),
+            workers=parser.getint('verify', 'workers', fallback=2),
+            max_latency=parser.getfloat('verify', 'max_latency', fallback=0.5),
+            fail_open=parser.getboolean('verify', 'fail_open', fallback=True),
+            hit_threshold=parser.getfloat('verify', 'hit_threshold', fallback=0.0),
+        )
+        upload = UploadSettings(
+            bucket=parser.get('upload', 'bucket', fallback=''),
+            endpoint=parser.get('upload', 'endpoint', fallback=''),
+            region=parser.get('upload', 'region', fallback=''),
+            prefix=parser.get('upload', 'prefix', fallback=''),
+            access_key=parser.get('upload', 'access_key', fallback=''),
+            secret_key=parser.get('upload', 'secret_key', fallback=''),
+            workers=parser.getint('upload', 'workers', fallback=4),
+            part_size_mb=parser.getfloat('upload', 'part_size_mb', fallback=8.0),
+            max_mbps=parser.getfloat('upload', 'max_mbps', fallback=0.0),
+        )
+        archive = ArchiveSettings(
+            fps=parser.getfloat('archive', 'fps', fallback=0.0),
+            width=parser.getint('archive', 'width', fallback=320),
+            retention_days=parser.getfloat('archive', 'retention_days', fallback=7.0),
+        )
+        compact = CompactSettings(
+            workers=parser.getint('compact', 'workers', fallback=0),
+            fourcc=parser.get('compact', 'fourcc', fallback='VP90'),
+            scale=parser.getfloat('compact', 'scale', fallback=1.0),
+            hours=parser.get('compact', 'hours', fallback=''),
+            idle_load=parser.getfloat('compact', 'idle_load', fallback=0.25),
+            nice=parser.getint('compact', 'nice', fallback=19),
+            min_age_minutes=parser.getfloat('compact', 'min_age_minutes', fallback=30.0),
+        )
+        if len(compact.fourcc) != 4:
+            raise ValueError(f"compact fourcc must be 4 characters, got {compact.fourcc!r}")
+        if not 0 < compact.scale <= 1:
+            raise ValueError("compact scale must be in (0, 1]")
+        if compact.hours and not all(v.isdigit() and int(v) <= 24 for v in compact.hours.split('-', 1)):
+            raise ValueError(f"compact hours must look like 1-6, got {compact.hours!r}")
+        if not 0 < runtime.overload_low < runtime.overload_high <= 1:
+            raise ValueError("overload_low must be below overload_high, both in (0, 1]")
+        if verify.mode not in ('none', 'hog'):
+            raise ValueError(f"unknown verify mode {verify.mode!r}")
+    except (configparser.Error, ValueError) as e:
+        raise ValueError(f"Invalid config {path}: {e}") from e
+    return Config(path=path, cam=cam, mail=mail, runtime=runtime, verify=verify, upload=upload,
+                  archive=archive, compact=compact)
@@ -0,0 +1,154 @@
+"""背景模型运动检测（实时录制与离线重分析共用）"""
+import os
+import logging
+
+import cv2
+import numpy as np
+
+
+
+def background_path(root, camera, size):
+    """背景模型检查点路径，按摄像头与分辨率区分；size 为 (宽, 高)"""
+    return os.path.join(root, 'background', f"{camera}_{size[0]}x{size[1]}.npy")
+
+
+class MotionDetector:
+    """累积加权背景 + 差分阈值 + 轮廓面积判定"""
+
+    def __init__(self, alpha=0.05, blur=21, threshold=30, min_area=8000):
+        self.alpha = alpha
+        self.blur = blur
+        self.threshold = threshold
+        self.min_area = min_area
+        self.background = None
+        self.contours = ()
+        # 可选的 trace.Tracer，记录 preprocess / background / contours 三个阶段
+        self.tracer = None
+        # 可选的 stabilize.ShakeCompensator，差分前把帧平移回背景坐标
+        self.stabilizer = None
+        # 检测分辨率比例（过载降级时为 0.5）；面积阈值与返回的面积、轮廓始终按原图像素计
+        self.scale = 1.0
+        self.warm_tolerance = 12.0
+        self._check_warm = False
+
+    def reset(self):
+        self.background = None
+        self.contours = ()
+        self._check_warm = False
+
+    def warm_start(self):
+        """重连后保留现有背景，但下一帧先做场景比对，不一致时丢弃"""
+        if self.background is not None:
+            self._check_warm = True
+
+    def scene_matches(self, gray, tolerance):
+        """在 1/8 缩略图上比较当前帧与背景的平均灰度差"""
+        if self.background is None or self.background.shape != gray.shape:
+            return False
+        h, w = gray.shape
+        size = (max(w // 8, 1), max(h // 8, 1))
+        small = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+        bg = cv2.resize(cv2.convertScaleAbs(self.background), size, interpolation=cv2.INTER_AREA)
+        return float(cv2.absdiff(small, bg).mean()) <= tolerance
+
+    def set_scale(self, scale):
+        """切换检测分辨率；已有背景按比例缩放后沿用，不必重新建立"""
+        if scale == self.scale:
+            return
+        if self.background is not None:
+            h, w = self.background.shape
+            size = (max(round(w / self.scale * scale), 1), max(round(h / self.scale * scale), 1))
+            self.background = cv2.resize(self.background, size, interpolation=cv2.INTER_AREA)
+        self.scale = scale
+
+    def save_background(self, path):
+        """原子写入检查点（先写临时文件再 rename）"""
+        if self.background is None:
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.save(f, self.background)
+        os.replace(tmp, path)
+        return True
+
+    def load_background(self, path):
+        """载入检查点，首帧比对通过后才会真正使用"""
+        try:
+            background = np.load(path)
+        except (OSError, ValueError):
+            return False
+        if background.dtype != np.float32 or background.ndim != 2:
+            return False
+        self.background = background
+        self.warm_start()
+        return True
+
+    def preprocess(self, frame):
+        blur = self.blur
+        if self.scale != 1.0:
+            h, w = frame.shape[:2]
+            size = (max(round(w * self.scale), 1), max(round(h * self.scale), 1))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            blur = max(int(blur * self.scale) | 1, 3)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (blur, blur), 0)
+
+    def process(self, frame):
+        """返回 (motion, changed, max_area)；首帧仅用于建立背景，返回 None"""
+        tracer = self.tracer
+        if tracer is not None:
+            t0 = tracer.now()
+        gray = self.preprocess(frame)
+        if tracer is not None:
+            t0 = tracer.span('preprocess', t0)
+
+        if self._check_warm:
+            self._check_warm = False
+            if not self.scene_matches(gray, self.warm_tolerance):
+                logging.info("Background model does not match the scene, rebuilding.")
+                self.background = None
+            else:
+                logging.info("Background model restored.")
+
+        # 1. 初始化/更新动态背景
+        if self.background is None or self.background.shape != gray.shape:
+            # 预分配 float32 内存块，避免后续重复分配
+            self.background = gray.astype("float32")
+            return None
+
+        if self.stabilizer is not None:
+            gray = self.stabilizer.align(gray, self.background)
+            if tracer is not None:
+                t0 = tracer.span('stabilize', t0)
+
+        # 原地运算：直接修改 background 内存地址里的值
+        cv2.accumulateWeighted(gray, self.background, self.alpha)
+        avg_abs = cv2.convertScaleAbs(self.background)
+
+        # 2. 运动检测
+        diff = cv2.absdiff(gray, avg_abs)
+        thresh = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)[1]
+        thresh = cv2.dilate(thresh, None, iterations=2)
+        if tracer is None:
+            return self._score(thresh)
+        t0 = tracer.span('background', t0)
+        result = self._score(thresh)
+        tracer.span('contours', t0)
+        return result
+
+    def _score(self, thresh):
+        self.contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        max_area = 0
+        for contour in self.contours:
+            area = cv2.contourArea(contour)
+            if area > max_area:
+                max_area = area
+        if self.scale != 1.0:
+            # 换算回原图像素，供面积判定与二级确认使用
+            max_area /= self.scale * self.scale
+            self.contours = tuple((c / self.scale).astype(np.int32) for c in self.contours)
+        motion = 1 if max_area >= self.min_area else 0
+        changed = cv2.countNonZero(thresh) / thresh.size
+        return motion, changed, max_area
@@ -0,0 +1,150 @@
+"""共享内存帧总线：每个摄像头一个环形帧槽，一个生产者写入，多个读进程零拷贝读取
+
+布局：控制块 int64[8] | 槽元数据 (seq int64, ts float64) * slots | 帧数据 * slots
+写入采用序号锁：先把槽 seq 置为 -1，拷贝帧，再写入新序号；读者用前后两次序号比较判断数据是否被覆盖。
+读者落后超过一圈时跳到环中仍保留的最旧帧并累计丢帧数，生产者从不等待读者。
+"""
+import time
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+_MAGIC = 0x44434246  # 'DCBF'
+_CTRL = 8            # magic, slots, height, width, channels, head_seq, 生产者的 resource_tracker pid, 保留
+_META_DTYPE = np.dtype([('seq', '<i8'), ('ts', '<f8')])
+
+
+def bus_name(camera):
+    return f"droidcam_{camera}"
+
+
+def _tracker_pid():
+    """本进程所用 resource_tracker 的 pid；fork 出的子进程与父进程共用同一个 tracker"""
+    return getattr(resource_tracker._resource_tracker, '_pid', None) or 0
+
+
+def _layout(slots, shape):
+    frame_bytes = int(np.prod(shape))
+    meta_off = _CTRL * 8
+    data_off = meta_off + slots * _META_DTYPE.itemsize
+    # 帧数据按 64 字节对齐
+    data_off = (data_off + 63) // 64 * 64
+    return meta_off, data_off, frame_bytes, data_off + slots * frame_bytes
+
+
+class _Mapped:
+    def _map(self, shm, slots, shape):
+        meta_off, data_off, frame_bytes, _ = _layout(slots, shape)
+        self._shm = shm
+        self.slots = slots
+        self.shape = shape
+        self._ctrl = np.ndarray((_CTRL,), dtype='<i8', buffer=shm.buf)
+        self._meta = np.ndarray((slots,), dtype=_META_DTYPE, buffer=shm.buf, offset=meta_off)
+        self._frames = np.ndarray((slots,) + shape, dtype=np.uint8, buffer=shm.buf, offset=data_off)
+
+    def close(self):
+        # 先释放所有指向共享内存的视图，否则 SharedMemory.close 会报 BufferError
+        self._ctrl = self._meta = self._frames = None
+        self._shm.close()
+
+
+class FrameBus(_Mapped):
+    """生产者端：创建共享内存并逐帧发布"""
+
+    def __init__(self, camera, shape, slots=8):
+        self.name = bus_name(camera)
+        shape = tuple(int(v) for v in shape)
+        if len(shape) == 2:
+            shape = shape + (1,)
+        size = _layout(slots, shape)[3]
+        try:
+            shm = shared_memory.SharedMemory(self.name, create=True, size=size)
+        except FileExistsError:
+            # 上次异常退出残留的段，直接接管
+            stale = shared_memory.SharedMemory(self.name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(self.name, create=True, size=size)
+        self._map(shm, slots, shape)
+        self._meta['seq'] = -1
+        self._ctrl[:] = (_MAGIC, slots, shape[0], shape[1], shape[2], -1, _tracker_pid(), 0)
+        self.seq = -1
+
+    def publish(self, frame, ts):
+        seq = self.seq + 1
+        slot = seq % self.slots
+        meta = self._meta[slot]
+        meta['seq'] = -1
+        self._frames[slot].reshape(frame.shape)[...] = frame
+        meta['ts'] = ts
+        meta['seq'] = seq
+        self._ctrl[5] = seq
+        self.seq = seq
+        return seq
+
+    def close(self):
+        super().close()
+        self._shm.unlink()
+
+
+class FrameReader(_Mapped):
+    """读者端：attach 到已有总线；read() 返回指向共享内存的只读视图"""
+
+    def __init__(self, camera):
+        # 读者不拥有共享内存，避免退出时被 resource_tracker 误删（3.13 起可直接 track=False）
+        try:
+            shm = shared_memory.SharedMemory(bus_name(camera), track=False)
+            registered = False
+        except TypeError:
+            shm = shared_memory.SharedMemory(bus_name(camera))
+            registered = True
+        ctrl = np.ndarray((_CTRL,), dtype='<i8', buffer=shm.buf)
+        if ctrl[0] != _MAGIC:
+            del ctrl
+            shm.close()
+            raise ValueError(f"{bus_name(camera)} is not a frame bus")
+        # 从生产者 fork 出的读者与其共用 tracker，刚才的注册就是生产者那一条（集合去重），
+        # 注销会让生产者 unlink 时 tracker 报 KeyError；只有自己的 tracker 才需要注销
+        if registered and int(ctrl[6]) != _tracker_pid():
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        slots, shape = int(ctrl[1]), (int(ctrl[2]), int(ctrl[3]), int(ctrl[4]))
+        del ctrl
+        self._map(shm, slots, shape)
+        self.next_seq = max(int(self._ctrl[5]), 0)
+        self.dropped = 0
+
+    @property
+    def head(self):
+        return int(self._ctrl[5])
+
+    def read(self, timeout=1.0, poll=0.002):
+        """返回 (seq, ts, frame_view)，超时返回 None；frame_view 在 valid(seq) 为真时才可信"""
+        deadline = time.monotonic() + timeout
+        while True:
+            head = self.head
+            if head >= self.next_seq:
+                # 落后超过一圈：跳到仍保留在环中的最旧帧
+                oldest = head - self.slots + 1
+                if self.next_seq < oldest:
+                    self.dropped += oldest - self.next_seq
+                    self.next_seq = oldest
+                seq = self.next_seq
+                slot = seq % self.slots
+                if int(self._meta[slot]['seq']) == seq:
+                    ts = float(self._meta[slot]['ts'])
+                    view = self._frames[slot]
+                    view.flags.writeable = False
+                    self.next_seq = seq + 1
+                    return seq, ts, view
+                # 槽正在被改写（生产者已追上），重新判断
+                continue
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(poll)
+
+    def valid(self, seq):
+        """处理完视图后调用：为假说明处理期间该槽已被覆盖，结果应丢弃"""
+        return int(self._meta[seq % self.slots]['seq']) == seq
+
+    def lag(self):
+        return self.head - self.next_seq + 1
@@ -0,0 +1,89 @@
+"""内存稳定性：周期性 RSS / tracemalloc 采样、增长告警，以及可配置的 GC 策略"""
+import gc
+import os
+import time
+import logging
+import tracemalloc
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_bytes():
+    """当前常驻内存；非 Linux 平台退回到 ru_maxrss（峰值）"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def apply_gc_policy(policy, threshold=None):
+    """policy: auto 保持解释器默认；freeze 把启动期对象移出分代回收；manual 关闭自动回收，由调用方定期 collect
+
+    threshold 为 (gen0, gen1, gen2)，对 auto / freeze 生效。
+    """
+    if policy not in ('auto', 'freeze', 'manual'):
+        raise ValueError(f"Unknown gc policy: {policy}")
+    if threshold:
+        gc.set_threshold(*threshold)
+    if policy == 'freeze':
+        gc.collect()
+        gc.freeze()
+    elif policy == 'manual':
+        gc.disable()
+    logging.info(f"GC policy: {policy}, thresholds {gc.get_threshold()}, frozen {gc.get_freeze_count()}")
+
+
+class MemoryMonitor:
+    """在主循环里逐帧调用 tick()，只在到达采样间隔时才真正做事"""
+
+    def __init__(self, interval=60.0, warn_mb=200.0, trace_frames=0, top=10):
+        self.interval = interval
+        self.warn_bytes = warn_mb * 1024 * 1024
+        self.top = top
+        self.baseline = None
+        self.samples = []  # [(monotonic, rss)]
+        self._next = 0.0
+        self._snapshot = None
+        self._warned = False
+        if trace_frames > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(trace_frames)
+
+    def tick(self, now=None):
+        now = time.monotonic() if now is None else now
+        if now < self._next:
+            return
+        self._next = now + self.interval
+        self.sample(now)
+
+    def sample(self, now=None):
+        now = time.monotonic() if now is None else now
+        rss = rss_bytes()
+        if self.baseline is None:
+            self.baseline = rss
+        self.samples.append((now, rss))
+        del self.samples[:-1440]
+        growth = rss - self.baseline
+        logging.info(f"Memory: rss {rss / 1048576:.1f} MB ({growth / 1048576:+.1f} MB since start)")
+
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+            if self._snapshot is not None:
+                for stat in snapshot.compare_to(self._snapshot, 'lineno')[:self.top]:
+                    if stat.size_diff:
+                        logging.info(f"  alloc {stat}")
+            self._snapshot = snapshot
+
+        if growth > self.warn_bytes and not self._warned:
+            logging.warning(f"Memory grew {growth / 1048576:.1f} MB since start, above {self.warn_bytes / 1048576:.0f} MB")
+            self._warned = True
+        elif growth <= self.warn_bytes:
+            self._warned = False
+        return rss
+
+    def growth(self):
+        return 0 if self.baseline is None else self.samples[-1][1] - self.baseline
@@ -0,0 +1,440 @@
+"""实时监控：连接 DroidCam 视频流，检测到运动时录制片段"""
+import gc
+import os
+import time
+import signal
+import logging
+import threading
+import traceback
+from collections import deque
+from pathlib import Path
+
+import cv2
+
+from .detect import MotionDetector, background_path
+from .memwatch import MemoryMonitor, apply_gc_policy
+from .recorder import SegmentRecorder
+from .timeline import TimelineWriter
+from .trace import NullTracer, Tracer
+
+
+def safe_release(video, recorder):
+    """安全释放资源的辅助函数"""
+    try:
+        if video is not None: video.release()
+        if recorder is not None: recorder.release()
+        cv2.destroyAllWindows()
+    except:
+        pass
+
+
+# 读流永久卡死、进程无法自行恢复时的退出码（EX_TEMPFAIL），交给 systemd 等进程管理器重启
+EXIT_STALLED = 75
+
+
+def stream_timeouts_supported():
+    return (hasattr(cv2, 'CAP_PROP_READ_TIMEOUT_MSEC')
+            and cv2.videoio_registry.hasBackend(cv2.CAP_FFMPEG))
+
+
+def open_stream(url, timeout):
+    """打开视频流；FFmpeg 后端支持时设置打开/读取超时，断流时 read() 会返回失败而不是挂起
+
+    带超时打开失败（摄像头离线）时直接返回未打开的对象由调用方重连，不退回无超时的打开方式；
+    只有后端或属性本身不受支持时才用默认后端，此时由 ReadWatchdog 兜底。
+    """
+    if timeout > 0 and stream_timeouts_supported():
+        ms = int(timeout * 1000)
+        return cv2.VideoCapture(url, cv2.CAP_FFMPEG,
+                                [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, ms, cv2.CAP_PROP_READ_TIMEOUT_MSEC, ms])
+    return cv2.VideoCapture(url)
+
+
+class ReadWatchdog(threading.Thread):
+    """后台检查打开流与 read() 是否卡住，并强制恢复
+
+    阻塞中的 VideoCapture 不能从其他线程安全释放（FFmpeg 会在读取途中被释放上下文），因此分两级：
+      - 超过 timeout 未返回：告警并置 stalled；调用一旦返回，主循环丢弃这个连接并重连
+      - 超过 abort_after 仍未返回：进程已无法自行恢复，记录后以 EXIT_STALLED 退出，由进程管理器重启
+    带超时的 FFmpeg 后端下调用会在 timeout 内自行返回，第二级只在不支持超时的后端上出现。
+    """
+
+    def __init__(self, timeout, abort_after=None):
+        super().__init__(name='read-watchdog', daemon=True)
+        self.timeout = timeout
+        self.abort_after = abort_after if abort_after is not None else timeout * 6
+        self.stalls = 0
+        self.stalled = False
+        self._since = None
+        self._halt = threading.Event()
+
+    def begin(self):
+        """即将进入可能阻塞的调用"""
+        self._since = time.monotonic()
+
+    def feed(self):
+        """调用已返回"""
+        self._since = None
+
+    def run(self):
+        while not self._halt.wait(self.timeout / 4):
+            since = self._since
+            if since is None:
+                continue
+            idle = time.monotonic() - since
+            if idle > self.abort_after:
+                logging.critical(f"Stream call blocked for {idle:.1f}s and cannot be interrupted, exiting for restart")
+                logging.shutdown()
+                os._exit(EXIT_STALLED)
+            if idle > self.timeout and not self.stalled:
+                self.stalled = True
+                self.stalls += 1
+                logging.warning(f"No frame for {idle:.1f}s, stream looks stalled")
+
+    def stop(self):
+        self._halt.set()
+
+
+def run(config):
+    cam = config.cam
+    rt = config.runtime
+
+    # --- 1. 环境与硬件优化 (CPU 模式) ---
+    cv2.ocl.setUseOpenCL(False)  # 显式关闭 OpenCL，确保稳定性
+    cv2.setNumThreads(8)         # 充分利用 5700G 的 8 核
+    logging.info("Hardware Mode: Pure CPU Optimization (AMD Ryzen 7 5700G)")
+
+    # --- 2. 存储目录检查 ---
+    Path(cam.storage_path).mkdir(parents=True, exist_ok=True)
+
+    # --- 3. 信号处理 ---
+    need_to_end = False
+    def signal_handler(sig, frame):
+        nonlocal need_to_end
+        logging.info("Interrupt received, shutting down...")
+        need_to_end = True
+
+    signal.signal(signal.SIGINT, signal_handler)
+
+    # 逐帧阶段追踪：SIGUSR1 触发导出，退出时再导出一次
+    tracer = NullTracer()
+    dump_requested = False
+    if rt.trace_spans > 0:
+        tracer = Tracer(rt.trace_spans)
+        def dump_handler(sig, frame):
+            nonlocal dump_requested
+            dump_requested = True
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, dump_handler)
+        logging.info(f"Tracing enabled: {rt.trace_spans} spans, send SIGUSR1 to dump")
+
+    def dump_trace():
+        path = os.path.join(cam.storage_path, 'trace', f"trace_{time.strftime('%Y%m%d%H%M%S')}.json")
+        logging.info(f"Trace written: {tracer.dump(path)} ({len(tracer)} spans)")
+
+    # 逐帧运动时间线（跨重连复用，仅在退出时关闭）
+    timeline = TimelineWriter(cam.storage_path, cam.camera_name)
+    # 背景模型在重连之间保留，并定期写入检查点，重启后可热启动
+    detector = MotionDetector()
+    detector.warm_tolerance = rt.background_tolerance
+    if rt.trace_spans > 0:
+        detector.tracer = tracer
+    if cam.stabilize:
+        from .stabilize import ShakeCompensator
+        detector.stabilizer = ShakeCompensator(budget_ms=cam.stabilize_budget_ms)
+        logging.info(f"Shake compensation enabled, budget {cam.stabilize_budget_ms:g} ms/frame")
+    checkpoint_path = None
+    next_checkpoint = 0.0
+    watchdog = None
+    if rt.read_timeout > 0:
+        watchdog = ReadWatchdog(rt.read_timeout)
+        watchdog.start()
+
+    # 可选的二级确认；候选验证期间的帧暂存在 preroll 中，确认后补写进片段开头
+    verifier = None
+    if config.verify.mode == 'hog':
+        from .verify import CascadeVerifier
+        v = config.verify
+        verifier = CascadeVerifier(detector.min_area, v.workers, v.max_latency, v.fail_open, v.hit_threshold)
+        logging.info(f"Cascade verification enabled: HOG, {v.workers} workers, max latency {v.max_latency}s")
+    preroll = deque(maxlen=int(60 * config.verify.max_latency) + 2)
+
+    # 可选的异步上传：片段关闭时入队，后台线程上传
+    uploads = None
+    if config.upload.bucket:
+        from .upload import S3Uploader, UploadQueue
+        uploads = UploadQueue(S3Uploader(config.upload, cam.storage_path))
+        uploads.start()
+        logging.info(f"Uploading closed segments to bucket {config.upload.bucket}")
+
+    # 可选的延迟压缩：夜间或空闲时在低优先级子进程中转码已关闭的片段，录制时立即暂停
+    compactor = None
+    if config.compact.workers > 0:
+        from .compact import Compactor
+        compactor = Compactor(config.compact, cam.storage_path, uploads=uploads.uploader.state if uploads else None)
+        compactor.start()
+        logging.info(f"Compacting closed segments to {config.compact.fourcc} with {config.compact.workers} workers")
+
+    # 可选的共享内存帧总线（按分辨率创建，重连后分辨率变化时重建）
+    bus = None
+
+    # 可选的低分辨率连续存档：跨重连保留，保证每小时一个文件；分辨率变化时才重建
+    archive = None
+
+    # 可选的过载控制：跟不上时依次降低检测频率、检测分辨率、录制帧率、录制分辨率
+    load = None
+    if rt.overload_control:
+        from .overload import STATE_FILE, LoadController
+        load = LoadController(rt.overload_high, rt.overload_low,
+                              state_path=os.path.join(cam.storage_path, STATE_FILE))
+        load.save()
+        logging.info(f"Overload control enabled: degrade above {rt.overload_high:g}, recover below {rt.overload_low:g}")
+
+    def apply_load_level(level):
+        detector.set_scale(0.5 if level >= 2 else 1.0)
+        if recorder is not None:
+            recorder.stride = 2 if level >= 3 else 1
+            recorder.scale = 0.5 if level >= 4 else 1.0
+
+    # 启动期对象分配完毕后再应用 GC 策略（freeze 会把它们移出分代回收）
+    memory = MemoryMonitor(rt.memory_interval, rt.memory_warn_mb, rt.tracemalloc_frames)
+    apply_gc_policy(rt.gc_policy, rt.gc_threshold)
+
+    # --- 4. 主程序循环 ---
+    while not need_to_end:
+        video = None
+        recorder = None
+        preroll.clear()
+        if verifier is not None:
+            verifier.reset()
+        is_recording = False
+        last_motion_time = 0
+        recording_delay = 10
+
+        try:
+            if watchdog is not None:
+                watchdog.begin()
+            video = open_stream(cam.source_url, rt.read_timeout)
+            if watchdog is not None:
+                watchdog.feed()
+                watchdog.stalled = False
+
+            if not video.isOpened():
+                raise ValueError("Could not connect to camera stream.")
+
+            frame_width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+            frame_height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            # DroidCam 实际帧率会波动，用采集间隔的指数平均估算，初值 20
+            fps = 20.0
+            recorder = SegmentRecorder(cam.storage_path, (frame_width, frame_height),
+                                       static_threshold=cam.static_threshold, min_fps=cam.min_record_fps,
+                                       on_close=uploads.enqueue if uploads else None)
+
+            logging.info(f"Connected. Resolution: {frame_width}x{frame_height}")
+
+            if config.archive.fps > 0 and (archive is None or archive.source_size != (frame_width, frame_height)):
+                from .archive import ArchiveRecorder
+                if archive is not None:
+                    archive.release()
+                a = config.archive
+                archive = ArchiveRecorder(cam.storage_path, cam.camera_name, (frame_width, frame_height),
+                                          a.fps, a.width, a.retention_days)
+
+            # 热启动：同分辨率沿用内存中的背景，否则尝试载入该分辨率的检查点；首帧比对不通过则重建
+            path = background_path(cam.storage_path, cam.camera_name, (frame_width, frame_height))
+            if detector.background is not None and detector.background.shape == (frame_height, frame_width):
+                detector.warm_start()
+            else:
+                detector.reset()
+                if detector.load_background(path):
+                    logging.info(f"Loaded background checkpoint {path}")
+            checkpoint_path = path
+            next_checkpoint = time.monotonic() + rt.background_checkpoint
+
+            if rt.frame_bus_slots > 0 and (bus is None or bus.shape[:2] != (frame_height, frame_width)):
+                from .framebus import FrameBus
+                if bus is not None:
+                    bus.close()
+                bus = FrameBus(cam.camera_name, (frame_height, frame_width, 3), rt.frame_bus_slots)
+                logging.info(f"Frame bus {bus.name}: {rt.frame_bus_slots} slots")
+
+            if load is not None:
+                apply_load_level(load.level)
+
+            skip_frame_cnt = 0
+            last_capture_ts = None
+            frame_index = 0
+            last_result = None
+            loop_end = None
+
+            while not need_to_end:
+                tracer.frame += 1
+                t0 = tracer.now()
+                if watchdog is not None:
+                    watchdog.begin()
+                check, frame = video.read()
+                if watchdog is not None:
+                    watchdog.feed()
+                    if watchdog.stalled:
+                        watchdog.stalled = False
+                        logging.warning("Stream stalled, reconnecting...")
+                        break
+                if not check:
+                    logging.warning("Frame read failed, reconnecting...")
+                    break
+                t0 = tracer.span('capture', t0)
+                read_end = time.perf_counter()
+                write_time = 0.0
+                frame_index += 1
+                capture_ts = time.time()
+                if last_capture_ts is not None and capture_ts > last_capture_ts:
+                    fps = 0.95 * fps + 0.05 * min(max(1.0 / (capture_ts - last_capture_ts), 1.0), 60.0)
+                last_capture_ts = capture_ts
+                if bus is not None and frame.shape == bus.shape:
+                    bus.publish(frame, capture_ts)
+                    tracer.span('publish', t0)
+
+                # 核心处理：灰度化、模糊、背景更新与轮廓判定（降级时隔帧检测，沿用上一结果）
+                if load is not None and load.level >= 1 and frame_index % 2 and last_result is not None:
+                    result = last_result
+                else:
+                    result = last_result = detector.process(frame)
+                if result is None:
+                    continue
+                motion, changed, max_area = result
+
+                if motion == 1:
+                    last_motion_time = capture_ts
+
+                # 3. 录制逻辑
+                start_recording = False
+                if not is_recording:
+                    if verifier is None:
+                        start_recording = motion == 1
+                    else:
+                        t0 = tracer.now()
+                        if motion == 1:
+                            verifier.submit(frame, detector.contours)
+                        verdict = verifier.poll()
+                        tracer.span('verify', t0)
+                        if verdict:
+                            start_recording = True
+                        elif verifier.pending:
+                            preroll.append((frame, capture_ts))
+                        else:
+                            preroll.clear()
+
+                if start_recording:
+                    is_recording = True
+                    t0 = tracer.now()
+                    current_file_name = recorder.open(round(fps, 1))
+                    tracer.span('rollover', t0)
+                    logging.info(f"Recording started: {current_file_name} ({fps:.1f} fps)")
+                    if verifier is not None:
+                        stats = verifier.stats()
+                        logging.info(f"Verified after {len(preroll)} frames; confirmed {stats['confirmed']}, "
+                                     f"rejected {stats['rejected']}, timeouts {stats['timeouts']}, "
+                                     f"latency mean {stats['mean_latency'] * 1000:.0f} ms, p95 {stats['p95_latency'] * 1000:.0f} ms")
+                    t0 = tracer.now()
+                    for pre_frame, pre_ts in preroll:
+                        recorder.write(pre_frame, pre_ts)
+                    preroll.clear()
+                    tracer.span('write', t0)
+
+                frame_recorded = False
+                if is_recording and recorder.is_open:
+                    t0 = tracer.now()
+                    w0 = time.perf_counter()
+                    frame_recorded = recorder.write(frame, capture_ts)
+                    write_time = time.perf_counter() - w0
+                    tracer.span('write', t0)
+
+                    # 停止录制条件
+                    time_since_motion = capture_ts - last_motion_time
+                    if motion == 0 and time_since_motion > recording_delay:
+                        logging.info(f"Motion stopped. Closing file ({recorder.skip_cnt} static frames skipped).")
+                        t0 = tracer.now()
+                        recorder.release()
+                        tracer.span('rollover', t0)
+                        is_recording = False
+
+                    # 强制分段条件
+                    elif recorder.write_cnt > 1200:
+                        logging.info("Segment limit reached. Rolling file.")
+                        t0 = tracer.now()
+                        recorder.open(round(fps, 1), suffix='_cont')
+                        tracer.span('rollover', t0)
+
+                if archive is not None:
+                    t0 = tracer.now()
+                    if archive.write(frame, capture_ts):
+                        tracer.span('archive', t0)
+
+                if compactor is not None:
+                    compactor.set_busy(is_recording or (load is not None and load.level > 0))
+
+                t0 = tracer.now()
+                timeline.append(capture_ts, changed, max_area, frame_recorded, load.level if load else 0)
+                tracer.span('timeline', t0)
+
+                if dump_requested:
+                    dump_requested = False
+                    dump_trace()
+
+                if rt.background_checkpoint > 0 and time.monotonic() >= next_checkpoint:
+                    # 降级到半分辨率检测期间不写检查点，检查点始终是原分辨率
+                    if detector.scale == 1.0:
+                        detector.save_background(checkpoint_path)
+                    next_checkpoint = time.monotonic() + rt.background_checkpoint
+
+                # 内存采样；manual 策略下保留原来的定期全量回收
+                memory.tick()
+                if rt.gc_policy == 'manual':
+                    skip_frame_cnt += 1
+                    if skip_frame_cnt > 2000:
+                        gc.collect()
+                        skip_frame_cnt = 0
+
+                if load is not None:
+                    now = time.perf_counter()
+                    if loop_end is not None:
+                        load.observe(now - loop_end, now - read_end, write_time)
+                    loop_end = now
+                    if load.update():
+                        apply_load_level(load.level)
+                        # 录制分辨率只能在新片段生效：正在录制时立即续段
+                        if recorder.size_changed:
+                            recorder.open(round(fps, 1), suffix='_cont')
+
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    need_to_end = True
+                    break
+
+        except Exception:
+            logging.error(f"Runtime error:\n{traceback.format_exc()}")
+        finally:
+            safe_release(video, recorder)
+            if not need_to_end:
+                time.sleep(5)  # 失败后等待重连
+
+    timeline.close()
+    if archive is not None:
+        archive.release()
+    if rt.trace_spans > 0:
+        dump_trace()
+    if watchdog is not None:
+        watchdog.stop()
+    if checkpoint_path and rt.background_checkpoint > 0 and detector.scale == 1.0:
+        detector.save_background(checkpoint_path)
+    if bus is not None:
+        bus.close()
+    if uploads is not None:
+        uploads.stop()
+    if compactor is not None:
+        compactor.stop()
+    if detector.stabilizer is not None:
+        logging.info(f"Shake compensation stats: {detector.stabilizer.stats()}")
+    if verifier is not None:
+        logging.info(f"Verification stats: {verifier.stats()}")
+        verifier.close()
+    logging.info("Program terminated cleanly.")
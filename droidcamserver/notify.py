@@ -0,0 +1,45 @@
+"""邮件通知（SMTP over SSL，可附带录像文件）"""
+import os
+import smtplib, ssl
+
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+
+def send_mail(mail, subject, body, attachment=None):
+    """mail 为 config.MailSettings；attachment 为可选的文件路径"""
+    # Create a multipart message and set headers
+    message = MIMEMultipart()
+    message["From"] = mail.sender_email
+    message["To"] = mail.receiver_email
+    message["Subject"] = subject
+    message["Bcc"] = mail.receiver_email  # Recommended for mass emails
+
+    # Add body to email
+    message.attach(MIMEText(body, "plain"))
+
+    if attachment is not None:
+        # Open file in binary mode
+        with open(attachment, "rb") as f:
+            # Add file as application/octet-stream
+            # Email client can usually download this automatically as attachment
+            part = MIMEBase("application", "octet-stream")
+            part.set_payload(f.read())
+
+        # Encode file in ASCII characters to send by email
+        encoders.encode_base64(part)
+
+        # Add header as key/value pair to attachment part
+        part.add_header(
+            "Content-Disposition",
+            f"attachment; filename= {os.path.basename(attachment)}",
+        )
+        message.attach(part)
+
+    # Log in to server using secure context and send email
+    context = ssl.create_default_context()
+    with smtplib.SMTP_SSL(mail.smtp_ssl_server, 465, context=context) as server:
+        server.login(mail.sender_email, mail.password)
+        server.sendmail(mail.sender_email, mail.receiver_email, message.as_string())
@@ -0,0 +1,128 @@
+"""过载控制：主循环跟不上采集时按固定顺序逐级降级，负载回落后带迟滞逐级恢复
+
+降级级别（累积生效）：
+  1 detect_stride  检测隔帧进行，跳过的帧沿用上一帧结果
+  2 detect_scale   检测在半分辨率上进行（背景模型按比例缩放沿用）
+  3 record_fps     录制只写每隔一帧
+  4 record_size    录制按半分辨率编码（正在录制时立即续段生效）
+
+观测信号（均为 0~1）：
+  busy   主循环处理耗时占帧周期的比例；接近 1 说明 read() 不再等待，帧在采集端堆积
+  write  编码写盘耗时占帧周期的比例（写盘与检测同在主循环，这就是写入积压的来源）
+  cpu    本进程 CPU 占全部核心的比例。不用系统负载：它包含本机的低优先级压缩转码（compact.py），
+         会形成"压缩抬高负载 -> 降级 -> 暂停压缩 -> 负载回落 -> 恢复"的振荡；
+         其他进程抢占 CPU 时主循环变慢，已经反映在 busy 上
+任一信号不低于 high 并持续 escalate_after 秒时降一级；全部低于 low 并持续 recover_after 秒时升一级。
+恢复后很快又需要降级时，恢复等待时间加倍（最多 8 倍），回到 0 级后复位，避免来回振荡。
+每次变化写日志，并原子写入 state_path（JSON），时间线每帧也记录当前级别。
+"""
+import os
+import json
+import time
+import logging
+
+LEVELS = ('normal', 'detect_stride', 'detect_scale', 'record_fps', 'record_size')
+STATE_FILE = 'load_state.json'
+
+
+class LoadController:
+
+    def __init__(self, high=0.85, low=0.6, escalate_after=2.0, recover_after=15.0, state_path=None,
+                 smoothing=0.05, history=50):
+        self.high = high
+        self.low = low
+        self.escalate_after = escalate_after
+        self.recover_after = recover_after
+        self.state_path = state_path
+        self.smoothing = smoothing
+        self.history = history
+        self.level = 0
+        self.busy = 0.0
+        self.write = 0.0
+        self.cpu = 0.0
+        self.changes = []
+        self._backoff = 1
+        self._over_since = None
+        self._under_since = None
+        self._last_recover = None
+        self._cpu_mark = (time.monotonic(), time.process_time())
+        self._cores = os.cpu_count() or 1
+
+    @property
+    def name(self):
+        return LEVELS[self.level]
+
+    def observe(self, cycle, work, write=0.0):
+        """每帧调用：cycle 为两帧之间的总时间，work 为除 read() 外的处理耗时，write 为编码写盘耗时"""
+        if cycle <= 0:
+            return
+        a = self.smoothing
+        self.busy += a * (min(work / cycle, 1.0) - self.busy)
+        self.write += a * (min(write / cycle, 1.0) - self.write)
+
+    def _sample_cpu(self, now):
+        wall, cpu = self._cpu_mark
+        if now - wall < 1.0:
+            return
+        used = time.process_time()
+        self.cpu = min((used - cpu) / (now - wall) / self._cores, 1.0)
+        self._cpu_mark = (now, used)
+
+    def update(self, now=None):
+        """根据当前信号决定是否换级，返回是否发生变化"""
+        now = time.monotonic() if now is None else now
+        self._sample_cpu(now)
+        pressure = max(self.busy, self.write, self.cpu)
+        if pressure >= self.high:
+            self._under_since = None
+            if self._over_since is None:
+                self._over_since = now
+            elif now - self._over_since >= self.escalate_after and self.level < len(LEVELS) - 1:
+                if self._last_recover is not None and now - self._last_recover < self.recover_after * self._backoff:
+                    self._backoff = min(self._backoff * 2, 8)
+                self._set(self.level + 1, now, pressure)
+                return True
+        elif pressure <= self.low:
+            self._over_since = None
+            if self._under_since is None:
+                self._under_since = now
+            elif now - self._under_since >= self.recover_after * self._backoff and self.level > 0:
+                self._last_recover = now
+                self._set(self.level - 1, now, pressure)
+                if self.level == 0:
+                    self._backoff = 1
+                return True
+        else:
+            self._over_since = self._under_since = None
+        return False
+
+    def _set(self, level, now, pressure):
+        old = self.level
+        self.level = level
+        self._over_since = self._under_since = None
+        change = dict(ts=time.time(), level=level, name=LEVELS[level], previous=LEVELS[old],
+                      busy=round(self.busy, 3), write=round(self.write, 3), cpu=round(self.cpu, 3))
+        self.changes = (self.changes + [change])[-self.history:]
+        message = (f"Load level {old} -> {level} ({LEVELS[level]}): busy {self.busy:.2f}, "
+                   f"write {self.write:.2f}, cpu {self.cpu:.2f}")
+        if level > old:
+            logging.warning(message)
+        else:
+            logging.info(message)
+        self.save()
+
+    def state(self):
+        return dict(level=self.level, name=self.name, busy=round(self.busy, 3), write=round(self.write, 3),
+                    cpu=round(self.cpu, 3), updated=time.time(), changes=self.changes)
+
+    def save(self):
+        """原子写入当前状态，供 droidcamserver load status 或外部监控读取"""
+        if not self.state_path:
+            return
+        tmp = self.state_path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.state(), f)
+            os.replace(tmp, self.state_path)
+        except OSError as e:
+            logging.error(f"Cannot write load state {self.state_path}: {e}")
@@ -0,0 +1,194 @@
+"""实时预览 + 全量录制：采集、显示、写盘各在独立线程，互不阻塞
+
+- 采集线程只做 read()：帧放进有界写盘队列，同时覆盖"最新帧"供预览取用
+- 写盘线程按流的实际分辨率与帧率创建 VideoWriter；队列满时丢帧并计数，采集从不等待磁盘
+- 主线程（HighGUI 要求在主线程）按 display_fps 取最新帧，缩小后叠加实测帧率与丢帧数再显示；
+  窗口拖动或显示变慢只会少显示几帧，不影响采集与录制
+"""
+import time
+import queue
+import logging
+import threading
+from collections import deque
+
+import cv2
+
+from .monitor import open_stream
+
+
+class RateMeter:
+    """最近 window 个事件的平均速率（次/秒）"""
+
+    def __init__(self, window=60):
+        self._times = deque(maxlen=window)
+
+    def tick(self, ts):
+        self._times.append(ts)
+
+    @property
+    def rate(self):
+        if len(self._times) < 2 or self._times[-1] <= self._times[0]:
+            return 0.0
+        return (len(self._times) - 1) / (self._times[-1] - self._times[0])
+
+
+class CaptureThread(threading.Thread):
+
+    def __init__(self, video, frames):
+        super().__init__(name='capture', daemon=True)
+        self.video = video
+        self.frames = frames
+        # (frame, ts)；整体替换引用，读者不需要加锁
+        self.latest = None
+        self.count = 0
+        self.dropped = 0
+        self.meter = RateMeter()
+        self._halt = threading.Event()
+
+    def run(self):
+        try:
+            while not self._halt.is_set():
+                ok, frame = self.video.read()
+                if not ok:
+                    logging.warning("Frame read failed, stopping capture")
+                    break
+                ts = time.time()
+                self.count += 1
+                self.meter.tick(ts)
+                self.latest = (frame, ts)
+                try:
+                    self.frames.put_nowait((frame, ts))
+                except queue.Full:
+                    self.dropped += 1
+        finally:
+            # 在采集线程里释放，避免与阻塞中的 read() 并发
+            self.video.release()
+            self.frames.put(None)
+
+    def stop(self):
+        self._halt.set()
+
+
+class WriterThread(threading.Thread):
+    """首帧决定写入尺寸；流未报告可信帧率时用前 probe 帧的采集间隔估算"""
+
+    def __init__(self, path, frames, stream_fps=0.0, fourcc='XVID', probe=30):
+        super().__init__(name='writer', daemon=True)
+        self.path = path
+        self.frames = frames
+        self.stream_fps = stream_fps
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.probe = probe
+        self.fps = None
+        self.size = None
+        self.count = 0
+
+    def run(self):
+        out = None
+        pending = []
+        try:
+            while True:
+                item = self.frames.get()
+                if item is None:
+                    break
+                if out is None:
+                    pending.append(item)
+                    if not (1.0 <= self.stream_fps <= 120.0) and len(pending) < self.probe:
+                        continue
+                    out = self._open(pending)
+                    for frame, _ in pending:
+                        self._write(out, frame)
+                    pending = []
+                    continue
+                self._write(out, item[0])
+            # 不足 probe 帧就结束时也写出已有的帧
+            if out is None and pending:
+                out = self._open(pending)
+                for frame, _ in pending:
+                    self._write(out, frame)
+        finally:
+            if out is not None:
+                out.release()
+
+    def _open(self, pending):
+        frame, first_ts = pending[0]
+        if 1.0 <= self.stream_fps <= 120.0:
+            self.fps = self.stream_fps
+        elif len(pending) > 1 and pending[-1][1] > first_ts:
+            self.fps = (len(pending) - 1) / (pending[-1][1] - first_ts)
+        else:
+            self.fps = 20.0
+        self.size = (frame.shape[1], frame.shape[0])
+        logging.info(f"Writing {self.path}: {self.size[0]}x{self.size[1]} @ {self.fps:.1f} fps")
+        return cv2.VideoWriter(self.path, self.fourcc, self.fps, self.size)
+
+    def _write(self, out, frame):
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size)
+        out.write(frame)
+        self.count += 1
+
+
+def _overlay(image, lines):
+    y = 22
+    for text in lines:
+        cv2.putText(image, text, (8, y), cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 0, 0), 3, cv2.LINE_AA)
+        cv2.putText(image, text, (8, y), cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 255, 0), 1, cv2.LINE_AA)
+        y += 22
+    return image
+
+
+def preview(url, output, display_fps=15.0, display_width=640, queue_size=120, window=True, timeout=10.0):
+    """预览并录制直到按 a/q、Ctrl+C 或断流；返回 (采集帧数, 写入帧数, 丢帧数)"""
+    video = open_stream(url, timeout)
+    if not video.isOpened():
+        raise ValueError(f"Could not open stream {url}")
+    stream_fps = video.get(cv2.CAP_PROP_FPS)
+
+    frames = queue.Queue(maxsize=queue_size)
+    capture = CaptureThread(video, frames)
+    writer = WriterThread(output, frames, stream_fps)
+    capture.start()
+    writer.start()
+
+    interval = 1.0 / display_fps if display_fps > 0 else 0.5
+    shown = RateMeter(30)
+    last_shown_ts = None
+    next_report = time.monotonic() + 5.0
+    try:
+        while capture.is_alive():
+            time.sleep(interval)
+            if not window:
+                if time.monotonic() >= next_report:
+                    next_report += 5.0
+                    logging.info(f"capture {capture.meter.rate:.1f} fps, written {writer.count}, "
+                                 f"dropped {capture.dropped}")
+                continue
+            latest = capture.latest
+            if latest is not None and latest[1] != last_shown_ts:
+                frame, last_shown_ts = latest
+                h, w = frame.shape[:2]
+                if display_width and w > display_width:
+                    image = cv2.resize(frame, (display_width, round(h * display_width / w)),
+                                       interpolation=cv2.INTER_AREA)
+                else:
+                    image = frame.copy()
+                shown.tick(time.monotonic())
+                cv2.imshow('Preview', _overlay(image, [
+                    f"capture {capture.meter.rate:.1f} fps  display {shown.rate:.1f} fps",
+                    f"written {writer.count}  dropped {capture.dropped}  queue {frames.qsize()}",
+                ]))
+            key = cv2.waitKey(1) & 0xFF
+            if key in (ord('a'), ord('q')):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        capture.stop()
+        capture.join(timeout + 1.0)
+        writer.join()
+        if window:
+            cv2.destroyAllWindows()
+
+    logging.info(f"Captured {capture.count} frames, wrote {writer.count} to {output}, dropped {capture.dropped}")
+    return capture.count, writer.count, capture.dropped
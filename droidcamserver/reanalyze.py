@@ -0,0 +1,94 @@
+"""离线重分析：用可覆盖的检测参数在已录制的 .avi 片段上重跑运动检测
+
+用法: droidcamserver reanalyze /path/to/storage --threshold 25 --min-area 6000 --step 2
+      droidcamserver reanalyze /path/to/storage --compare-stabilize   # 抖动补偿去掉了多少录制秒数
+"""
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from .detect import MotionDetector
+from .recorder import frame_clock
+from .segments import list_segments
+from .stabilize import ShakeCompensator
+
+
+def _init_worker():
+    # 并行度由进程池提供，单进程内不再开 OpenCV 线程
+    cv2.setNumThreads(1)
+
+
+def recorded_seconds(events, duration, hold=10.0):
+    """按实时录制规则估算会录下的秒数：每个事件从首次检出录到末次检出后 hold 秒"""
+    return sum(min(end + hold, duration) - start for start, end in events)
+
+
+def analyze_file(path, params, step=1, hold=10.0, stabilize=None):
+    """返回 (path, fps, frames, seconds, [(start_sec, end_sec), ...])
+
+    事件时间与片段时长按 .ts 旁路文件中的真实采集时间计算（没有时按名义帧率）。
+    stabilize 为 ShakeCompensator 的参数字典时，差分前先做抖动补偿。
+    """
+    video = cv2.VideoCapture(path)
+    if not video.isOpened():
+        raise ValueError(f"Could not open {path}")
+    fps = video.get(cv2.CAP_PROP_FPS) or 20.0
+    clock = frame_clock(path, fps)
+    detector = MotionDetector(**params)
+    if stabilize is not None:
+        detector.stabilizer = ShakeCompensator(**stabilize)
+    events = []
+    start = last = None
+    index = 0
+    try:
+        while True:
+            # 跳过的帧只 grab 不 retrieve，省掉解码到 BGR 的开销
+            if index % step:
+                if not video.grab():
+                    break
+                index += 1
+                continue
+            check, frame = video.read()
+            if not check:
+                break
+            result = detector.process(frame)
+            index += 1
+            if not result or not result[0]:
+                continue
+            t = clock(index - 1)
+            if start is not None and t - last <= hold:
+                last = t
+            else:
+                if start is not None:
+                    events.append((start, last))
+                start = last = t
+    finally:
+        video.release()
+    if start is not None:
+        events.append((start, last))
+    # 末帧之后再显示一个名义帧间隔
+    seconds = clock(index - 1) + 1.0 / fps if index else 0.0
+    return path, fps, index, seconds, events
+
+
+def reanalyze(directory, params, step=1, hold=10.0, workers=None, stabilize=None):
+    """并行分析目录下的录像片段，返回按时间排序的 [(path, fps, frames, seconds, events)]
+
+    只取文件名符合片段格式的文件，摘要视频与压缩中的临时文件不在其列。
+    """
+    files = [path for path, _, _ in list_segments(directory)]
+    workers = workers or os.cpu_count()
+    logging.info(f"Re-analyzing {len(files)} files with {workers} workers: {params}"
+                 + (f", shake compensation {stabilize}" if stabilize is not None else ""))
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {pool.submit(analyze_file, f, params, max(step, 1), hold, stabilize): f for f in files}
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                logging.error(f"{futures[future]}: {e}")
+    return [results[path] for path in files if path in results]
@@ -0,0 +1,133 @@
+"""事件片段录制：静止帧抑制 + 真实采集时间戳旁路文件 + 关键帧定位索引"""
+import os
+import logging
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from .seekindex import build_index
+from .segments import timestamps_path
+
+# 静止帧比较用的缩略图尺寸，足够判断画面是否变化且几乎不占 CPU
+THUMB_SIZE = (64, 48)
+
+
+def load_timestamps(video_path):
+    return np.fromfile(timestamps_path(video_path), dtype='<f8')
+
+
+def frame_clock(video_path, fps):
+    """返回 clock(n)：第 n 帧相对首帧的秒数
+
+    片段帧率不固定（静止帧被跳过），有 .ts 旁路文件时以其为准；没有旁路文件的旧片段、
+    或帧数超出旁路文件记录时按名义帧率推算。
+    """
+    try:
+        timestamps = load_timestamps(video_path)
+    except FileNotFoundError:
+        timestamps = np.empty(0)
+
+    def clock(n):
+        if n < len(timestamps):
+            return float(timestamps[n] - timestamps[0])
+        return n / fps
+
+    return clock
+
+
+class SegmentRecorder:
+    """封装 VideoWriter；与上一写入帧几乎相同的帧直接跳过，但保证不低于 min_fps"""
+
+    def __init__(self, storage_path, size, fourcc='XVID', static_threshold=2.0, min_fps=2.0, on_close=None):
+        self.storage_path = storage_path
+        # 片段关闭后的回调 on_close(path)，用于上传等后续处理；不能阻塞
+        self.on_close = on_close
+        self.size = size
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.static_threshold = static_threshold
+        self.min_interval = 1.0 / min_fps if min_fps > 0 else float('inf')
+        # 过载降级：stride 为 2 时只写每隔一帧；scale 为 0.5 时下一个片段起按半分辨率编码
+        self.stride = 1
+        self.scale = 1.0
+        self.frame_size = size
+        self.drop_cnt = 0
+        self._seen = 0
+        self.path = None
+        self.write_cnt = 0
+        self.skip_cnt = 0
+        self._out = None
+        self._timestamps = []
+        self._last_thumb = None
+        self._last_ts = 0.0
+
+    @property
+    def is_open(self):
+        return self._out is not None
+
+    def _scaled_size(self):
+        w, h = self.size
+        if self.scale == 1.0:
+            return w, h
+        return round(w * self.scale / 2) * 2, round(h * self.scale / 2) * 2
+
+    @property
+    def size_changed(self):
+        """scale 改变后当前片段仍按旧尺寸编码，需要续段才能生效"""
+        return self._out is not None and self.frame_size != self._scaled_size()
+
+    def open(self, fps, suffix=''):
+        """新建片段，fps 为当前测得的采集帧率（仅作为容器的名义帧率）"""
+        self.release()
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        self.path = os.path.join(self.storage_path, f"{timestamp}{suffix}.avi")
+        self.frame_size = self._scaled_size()
+        self._out = cv2.VideoWriter(self.path, self.fourcc, fps / self.stride, self.frame_size)
+        self.write_cnt = 0
+        self.skip_cnt = 0
+        self.drop_cnt = 0
+        self._seen = 0
+        self._timestamps = []
+        self._last_thumb = None
+        return self.path
+
+    def write(self, frame, ts):
+        """写入一帧，返回是否真正编码；ts 为采集时间"""
+        if self._out is None:
+            return False
+        self._seen += 1
+        if self.stride > 1 and self._seen % self.stride:
+            self.drop_cnt += 1
+            return False
+        thumb = cv2.cvtColor(cv2.resize(frame, THUMB_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        if (self._last_thumb is not None and self.static_threshold > 0
+                and ts - self._last_ts < self.min_interval
+                and cv2.norm(thumb, self._last_thumb, cv2.NORM_L1) / thumb.size < self.static_threshold):
+            self.skip_cnt += 1
+            return False
+        if self.frame_size != self.size:
+            self._out.write(cv2.resize(frame, self.frame_size, interpolation=cv2.INTER_AREA))
+        else:
+            self._out.write(frame)
+        self._timestamps.append(ts)
+        self._last_thumb = thumb
+        self._last_ts = ts
+        self.write_cnt += 1
+        return True
+
+    def release(self):
+        if self._out is None:
+            return
+        self._out.release()
+        self._out = None
+        timestamps = np.asarray(self._timestamps, dtype='<f8')
+        timestamps.tofile(timestamps_path(self.path))
+        try:
+            build_index(self.path, timestamps)
+        except (OSError, ValueError) as e:
+            logging.error(f"Cannot index {self.path}: {e}")
+        if self.on_close is not None:
+            try:
+                self.on_close(self.path)
+            except Exception as e:
+                logging.error(f"Segment close hook failed for {self.path}: {e}")
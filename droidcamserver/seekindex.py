@@ -0,0 +1,324 @@
+"""关键帧定位索引：片段关闭时写入 .idx 旁路文件，按采集时间或帧号快速、逐帧精确地定位
+
+每帧 24 字节：采集时间 / 该帧数据块在文件中的字节偏移 / 块大小 / 向前最近关键帧的帧号，
+关键帧的字节偏移即 index[index[n]['key']]['offset']。
+
+片段以静止帧抑制方式录制，帧率不固定，按名义帧率换算时间会越录越偏；有了逐帧采集时间，
+"跳到运动发生的那一刻"就是一次二分查找。定位不经过 OpenCV 的帧号跳转（AVI 上既慢又不保证准确）：
+按索引里的字节偏移把 [关键帧, 目标帧] 的数据块连同原文件的 hdrl 头复制成一个临时 AVI，
+从头解码再 grab 到目标帧，最多解码一个 GOP，且落点由构造保证。
+
+帧偏移优先取自 AVI 末尾的 idx1 索引；没有 idx1（录制中断、未正常 release）时逐块扫描 movi，
+并按 MPEG-4 VOP 头判断关键帧。
+"""
+import os
+import struct
+import logging
+import tempfile
+
+import cv2
+import numpy as np
+
+from .segments import SEGMENT_RE, index_path, parse_segment_name, timestamps_path
+
+INDEX_DTYPE = np.dtype([
+    ('ts', '<f8'),
+    ('offset', '<u8'),
+    ('size', '<u4'),
+    ('key', '<u4'),
+])
+_IDX1_DTYPE = np.dtype([('id', 'S4'), ('flags', '<u4'), ('offset', '<u4'), ('size', '<u4')])
+_AVIIF_KEYFRAME = 0x10
+_AVIF_HASINDEX = 0x10
+_AVIF_MUSTUSEINDEX = 0x20
+_VOP_START = b'\x00\x00\x01\xb6'
+
+
+def _is_video_chunk(fourcc):
+    return fourcc[:2] == b'00' and fourcc[2:4] in (b'dc', b'db')
+
+
+def _find_chunks(f, start, end):
+    """遍历 [start, end) 内的 RIFF 块，返回 {fourcc 或 LIST 类型: (数据起点, 大小)}（只取首个）"""
+    found = {}
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(12)
+        if len(header) < 8:
+            break
+        fourcc, size = struct.unpack('<4sI', header[:8])
+        key = header[8:12] if fourcc in (b'RIFF', b'LIST') else fourcc
+        found.setdefault(key, (pos + 8, size))
+        pos += 8 + size + (size & 1)
+    return found
+
+
+def _scan_movi(f, movi_start, movi_end):
+    """没有 idx1 时逐块扫描，按 VOP 编码类型判断关键帧"""
+    offsets, sizes, keys = [], [], []
+    pos = movi_start
+    while pos + 8 <= movi_end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        fourcc, size = struct.unpack('<4sI', header)
+        if fourcc == b'LIST':
+            # movi 内的 rec 列表：进入列表内部继续扫描
+            pos += 12
+            continue
+        if _is_video_chunk(fourcc):
+            head = f.read(min(size, 256))
+            i = head.find(_VOP_START)
+            offsets.append(pos)
+            sizes.append(size)
+            keys.append(i >= 0 and i + 4 < len(head) and head[i + 4] >> 6 == 0)
+        pos += 8 + size + (size & 1)
+    return np.array(offsets, np.uint64), np.array(sizes, np.uint32), np.array(keys, bool)
+
+
+def scan_avi(path):
+    """返回视频流各帧的 (块偏移, 块大小, 是否关键帧)"""
+    with open(path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        riff = _find_chunks(f, 0, file_size).get(b'AVI ')
+        if riff is None:
+            raise ValueError(f"{path} is not an AVI file")
+        start, size = riff
+        chunks = _find_chunks(f, start + 4, min(start + size, file_size))
+        if b'movi' not in chunks:
+            raise ValueError(f"{path} has no movi list")
+        movi_start, movi_size = chunks[b'movi']
+        # movi 数据以 'movi' 四字节开头
+        movi_fourcc = movi_start
+        movi_end = min(movi_start + movi_size, file_size)
+
+        if b'idx1' in chunks:
+            idx_start, idx_size = chunks[b'idx1']
+            f.seek(idx_start)
+            entries = np.frombuffer(f.read(idx_size), dtype=_IDX1_DTYPE,
+                                    count=idx_size // _IDX1_DTYPE.itemsize)
+            video = entries[np.isin(entries['id'], (b'00dc', b'00db'))]
+            if len(video):
+                offsets = video['offset'].astype(np.uint64)
+                # idx1 偏移通常相对 'movi' 四字节，个别写入器用文件绝对偏移
+                f.seek(movi_fourcc + int(offsets[0]))
+                if f.read(4) != video['id'][0]:
+                    movi_fourcc = 0
+                return (offsets + np.uint64(movi_fourcc), video['size'].copy(),
+                        (video['flags'] & _AVIIF_KEYFRAME) != 0)
+        logging.info(f"{path}: no usable idx1, scanning movi")
+        return _scan_movi(f, movi_start + 4, movi_end)
+
+
+def _nominal_timestamps(video_path, count):
+    """没有 .ts 旁路文件的旧片段：按文件名中的开始时间与名义帧率推算"""
+    video = cv2.VideoCapture(video_path)
+    fps = video.get(cv2.CAP_PROP_FPS) or 20.0
+    video.release()
+    parsed = parse_segment_name(video_path)
+    start = parsed[0].timestamp() if parsed else os.path.getmtime(video_path) - count / fps
+    return start + np.arange(count) / fps
+
+
+def build_index(video_path, timestamps=None):
+    """生成并原子写入 .idx；timestamps 缺省时读取 .ts 旁路文件，再没有则按名义帧率推算。返回索引数组"""
+    offsets, sizes, keyframes = scan_avi(video_path)
+    n = len(offsets)
+    if timestamps is None:
+        try:
+            timestamps = np.fromfile(timestamps_path(video_path), dtype='<f8')
+        except FileNotFoundError:
+            logging.info(f"{video_path}: no timestamp sidecar, using nominal frame rate")
+            timestamps = _nominal_timestamps(video_path, n)
+    if len(timestamps) != n:
+        logging.warning(f"{video_path}: {n} frames but {len(timestamps)} timestamps")
+    index = np.zeros(n, dtype=INDEX_DTYPE)
+    index['ts'] = np.nan
+    m = min(n, len(timestamps))
+    index['ts'][:m] = timestamps[:m]
+    index['offset'] = offsets
+    index['size'] = sizes
+    if n:
+        keyframes = keyframes.copy()
+        keyframes[0] = True
+        # 每帧向前最近的关键帧
+        index['key'] = np.maximum.accumulate(np.where(keyframes, np.arange(n), 0))
+
+    path = index_path(video_path)
+    tmp = path + '.tmp'
+    index.tofile(tmp)
+    os.replace(tmp, path)
+    return index
+
+
+def load_index(video_path):
+    """读取 .idx，不存在或尺寸不对时返回 None"""
+    path = index_path(video_path)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return None
+    if size % INDEX_DTYPE.itemsize:
+        return None
+    return np.fromfile(path, dtype=INDEX_DTYPE)
+
+
+def frame_at(index, ts):
+    """采集时间 ts 时画面上显示的帧号（不早于首帧）"""
+    return max(int(np.searchsorted(index['ts'], ts, side='right')) - 1, 0)
+
+
+def _copy_hdrl(data):
+    """复制 hdrl 列表：OpenDML 超级索引 indx 指向原文件偏移，改成 JUNK；清掉 avih 中的索引标志"""
+    out = bytearray(data)
+
+    def walk(pos, end):
+        while pos + 8 <= end:
+            fourcc, size = struct.unpack_from('<4sI', out, pos)
+            if fourcc == b'LIST':
+                walk(pos + 12, min(pos + 8 + size, end))
+            elif fourcc == b'indx':
+                out[pos:pos + 4] = b'JUNK'
+            elif fourcc == b'avih' and size >= 16:
+                # dwFlags 是 avih 的第 4 个 DWORD
+                flags = struct.unpack_from('<I', out, pos + 20)[0]
+                struct.pack_into('<I', out, pos + 20, flags & ~(_AVIF_HASINDEX | _AVIF_MUSTUSEINDEX))
+            pos += 8 + size + (size & 1)
+
+    walk(12, len(out))
+    return bytes(out)
+
+
+def write_gop(video_path, index, first, last, output):
+    """把第 first（须为关键帧）到 last 帧的数据块按字节偏移复制成一个独立的 AVI"""
+    with open(video_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        start, size = _find_chunks(f, 0, file_size)[b'AVI ']
+        chunks = _find_chunks(f, start + 4, min(start + size, file_size))
+        if b'hdrl' not in chunks:
+            raise ValueError(f"{video_path} has no hdrl list")
+        hdrl_start, hdrl_size = chunks[b'hdrl']
+        f.seek(hdrl_start - 8)
+        hdrl = _copy_hdrl(f.read(8 + hdrl_size + (hdrl_size & 1)))
+        with open(output, 'wb') as out:
+            out.write(b'RIFF\0\0\0\0AVI ')
+            out.write(hdrl)
+            movi = out.tell()
+            out.write(b'LIST\0\0\0\0movi')
+            for n in range(first, last + 1):
+                size = int(index['size'][n])
+                f.seek(int(index['offset'][n]))
+                chunk = f.read(8 + size + (size & 1))
+                if len(chunk) < 8 + size:
+                    raise ValueError(f"{video_path}: frame {n} is truncated")
+                out.write(chunk)
+            end = out.tell()
+            out.seek(movi + 4)
+            out.write(struct.pack('<I', end - movi - 8))
+            out.seek(4)
+            out.write(struct.pack('<I', end - 8))
+
+
+def open_at(video_path, frame, index=None, count=1):
+    """返回 VideoCapture，下一次 read() 恰好得到第 frame 帧，之后至少还能再读 count - 1 帧
+
+    目标帧不在首个 GOP 时，解码的是按字节偏移复制出的临时 AVI（打开后即删除），
+    其中只有 [关键帧, frame + count) 的数据；没有索引或在首个 GOP 内时打开原文件从头 grab。
+    """
+    if index is None:
+        index = load_index(video_path)
+    key = 0
+    if index is not None and len(index):
+        frame = min(frame, len(index) - 1)
+        key = int(index['key'][frame])
+    video = None
+    if key:
+        fd, tmp = tempfile.mkstemp(prefix='gop_', suffix='.avi')
+        os.close(fd)
+        try:
+            write_gop(video_path, index, key, min(frame + max(count, 1) - 1, len(index) - 1), tmp)
+            video = cv2.VideoCapture(tmp)
+            if not video.isOpened():
+                video = None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Cannot cut keyframe group from {video_path}: {e}")
+        finally:
+            # 已打开的文件删除后仍可读
+            os.remove(tmp)
+        if video is None:
+            key = 0
+    if video is None:
+        video = cv2.VideoCapture(video_path)
+        if not video.isOpened():
+            raise ValueError(f"Could not open {video_path}")
+    for _ in range(frame - key):
+        if not video.grab():
+            break
+    return video
+
+
+def backfill(directory, force=False, recursive=True):
+    """为目录（默认含 archive 等子目录）下缺少索引的片段补建 .idx，返回 (新建数, 失败数)"""
+    built = failed = 0
+    for root, dirs, files in os.walk(directory):
+        for name in sorted(files):
+            if not SEGMENT_RE.match(name):
+                continue
+            path = os.path.join(root, name)
+            if not force and os.path.exists(index_path(path)):
+                continue
+            try:
+                index = build_index(path)
+                built += 1
+                logging.info(f"Indexed {path}: {len(index)} frames, {len(np.unique(index['key']))} keyframes")
+            except (OSError, ValueError) as e:
+                failed += 1
+                logging.error(f"Cannot index {path}: {e}")
+        if not recursive:
+            break
+    return built, failed
+
+
+def export(video_path, output, ts, seconds=0.0):
+    """从采集时间 ts 处开始导出，返回导出的帧数
+
+    output 为 .jpg/.png 时只导出该时刻的一帧；否则导出 seconds 秒的片段，并为其写入 .ts 与 .idx。
+    """
+    index = load_index(video_path)
+    if index is None:
+        index = build_index(video_path)
+    if not len(index):
+        raise ValueError(f"{video_path} has no frames")
+    start = frame_at(index, ts)
+    end = max(frame_at(index, index['ts'][start] + seconds), start)
+    video = open_at(video_path, start, index, end - start + 1)
+    try:
+        if os.path.splitext(output)[1].lower() in ('.jpg', '.jpeg', '.png'):
+            check, frame = video.read()
+            if not check:
+                raise ValueError(f"Could not decode frame {start} of {video_path}")
+            cv2.imwrite(output, frame)
+            return 1
+        span = index['ts'][end] - index['ts'][start]
+        fps = (end - start) / span if span > 0 else video.get(cv2.CAP_PROP_FPS) or 20.0
+        out = None
+        timestamps = []
+        for n in range(start, end + 1):
+            check, frame = video.read()
+            if not check:
+                break
+            if out is None:
+                out = cv2.VideoWriter(output, cv2.VideoWriter_fourcc(*'XVID'), fps, (frame.shape[1], frame.shape[0]))
+            out.write(frame)
+            timestamps.append(index['ts'][n])
+        if out is None:
+            raise ValueError(f"Could not decode frame {start} of {video_path}")
+        out.release()
+    finally:
+        video.release()
+    timestamps = np.asarray(timestamps, dtype='<f8')
+    timestamps.tofile(os.path.splitext(output)[0] + '.ts')
+    build_index(output, timestamps)
+    return len(timestamps)
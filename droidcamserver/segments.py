@@ -0,0 +1,50 @@
+"""录像片段文件名解析：YYYYmmddHHMMSS.avi 为事件起点，YYYYmmddHHMMSS_cont.avi 为分段续录"""
+import os
+import re
+from datetime import datetime
+
+SEGMENT_RE = re.compile(r'^(\d{14})(_cont)?\.avi$')
+
+
+def timestamps_path(video_path):
+    """片段对应的时间戳旁路文件：每个写入帧一个 float64 采集时间"""
+    return os.path.splitext(video_path)[0] + '.ts'
+
+
+def index_path(video_path):
+    """片段对应的关键帧定位索引旁路文件（见 seekindex.py）"""
+    return os.path.splitext(video_path)[0] + '.idx'
+
+
+def parse_segment_name(name):
+    """返回 (开始时间, 是否续录)，不是录像片段时返回 None"""
+    m = SEGMENT_RE.match(os.path.basename(name))
+    if not m:
+        return None
+    return datetime.strptime(m.group(1), "%Y%m%d%H%M%S"), m.group(2) is not None
+
+
+def list_segments(directory, day=None):
+    """按时间顺序列出目录下的片段 [(path, start, is_cont)]，day 为 YYYYmmdd 时只取当天"""
+    segments = []
+    for name in os.listdir(directory):
+        parsed = parse_segment_name(name)
+        if parsed is None or (day and not name.startswith(day)):
+            continue
+        segments.append((os.path.join(directory, name), parsed[0], parsed[1]))
+    segments.sort(key=lambda s: (s[1], s[2]))
+    return segments
+
+
+def group_events(segments):
+    """把片段按事件分组：每个事件以非续录片段开始，后接若干 _cont 片段
+
+    返回 [(事件 id, 开始时间, [path, ...])]，事件 id 为首个片段的时间戳。
+    """
+    events = []
+    for path, start, is_cont in segments:
+        if is_cont and events:
+            events[-1][2].append(path)
+        else:
+            events.append((start.strftime("%Y%m%d%H%M%S"), start, [path]))
+    return events
@@ -0,0 +1,191 @@
+"""本地 HTTP 回看服务：事件列表、按事件生成的 M3U 播放列表，以及支持 Range 的片段下载
+
+只依赖标准库。片段用 os.sendfile 直接从页缓存发送到 socket，播放器拖动进度条时
+只请求需要的字节区间，不必下载整个文件。
+"""
+import os
+import re
+import json
+import struct
+import logging
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .segments import SEGMENT_RE, group_events, list_segments
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+_CHUNK = 1 << 20
+
+
+def parse_range(header, size):
+    """解析单区间 Range 头，返回 (start, end) 闭区间；无法满足时返回 None"""
+    m = _RANGE_RE.match(header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if m.group(1):
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else size - 1
+    else:
+        # bytes=-N：最后 N 个字节
+        start = max(size - int(m.group(2)), 0)
+        end = size - 1
+    end = min(end, size - 1)
+    if start > end:
+        return None
+    return start, end
+
+
+def segment_duration(path):
+    """从时间戳旁路文件估算片段时长（秒），没有旁路文件时返回 -1"""
+    ts_path = os.path.splitext(path)[0] + '.ts'
+    try:
+        with open(ts_path, 'rb') as f:
+            count = os.fstat(f.fileno()).st_size // 8
+            if count < 2:
+                return -1
+            first, = struct.unpack('<d', f.read(8))
+            f.seek((count - 1) * 8)
+            last, = struct.unpack('<d', f.read(8))
+    except OSError:
+        return -1
+    return round(last - first, 3)
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    # 保持连接，播放器拖动时可复用同一连接发起多个 Range 请求
+    protocol_version = 'HTTP/1.1'
+    storage_path = None
+
+    def do_HEAD(self):
+        self._dispatch(head=True)
+
+    def do_GET(self):
+        self._dispatch(head=False)
+
+    def _dispatch(self, head):
+        url = urlsplit(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        try:
+            if parts == ['events']:
+                day = parse_qs(url.query).get('day', [None])[0]
+                self._send_events(day, head)
+            elif len(parts) == 2 and parts[0] == 'events' and parts[1].endswith('.m3u'):
+                self._send_playlist(parts[1][:-4], head)
+            elif len(parts) == 2 and parts[0] == 'segments' and SEGMENT_RE.match(parts[1]):
+                self._send_segment(parts[1], head)
+            else:
+                self.send_error(HTTPStatus.NOT_FOUND)
+        except (BrokenPipeError, ConnectionResetError):
+            # 播放器拖动时经常主动断开旧连接
+            pass
+
+    def _events(self, day=None):
+        return group_events(list_segments(self.storage_path, day))
+
+    def _send_body(self, body, content_type, head):
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _send_events(self, day, head):
+        events = []
+        for event_id, start, paths in self._events(day):
+            events.append(dict(
+                id=event_id,
+                start=start.isoformat(),
+                segments=[os.path.basename(p) for p in paths],
+                bytes=sum(os.path.getsize(p) for p in paths),
+                playlist=f"/events/{event_id}.m3u",
+            ))
+        self._send_body(json.dumps(events).encode(), 'application/json', head)
+
+    def _send_playlist(self, event_id, head):
+        for eid, start, paths in self._events():
+            if eid == event_id:
+                break
+        else:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        base = f"http://{self.headers.get('Host') or '%s:%d' % self.server.server_address[:2]}"
+        lines = ['#EXTM3U']
+        for path in paths:
+            name = os.path.basename(path)
+            lines.append(f"#EXTINF:{segment_duration(path)},{name}")
+            lines.append(f"{base}/segments/{name}")
+        self._send_body(('\n'.join(lines) + '\n').encode(), 'audio/x-mpegurl', head)
+
+    def _send_segment(self, name, head):
+        path = os.path.join(self.storage_path, name)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            start, end = 0, size - 1
+            status = HTTPStatus.OK
+            if self.headers.get('Range'):
+                rng = parse_range(self.headers['Range'], size)
+                if rng is None:
+                    self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                    self.send_header('Content-Range', f'bytes */{size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                start, end = rng
+                status = HTTPStatus.PARTIAL_CONTENT
+            length = end - start + 1 if size else 0
+
+            self.send_response(status)
+            self.send_header('Content-Type', 'video/x-msvideo')
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Content-Length', str(length))
+            if status == HTTPStatus.PARTIAL_CONTENT:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            self.end_headers()
+            if head or not length:
+                return
+            self.wfile.flush()
+            self._copy(f, start, length)
+
+    def _copy(self, f, offset, count):
+        try:
+            sock_fd = self.connection.fileno()
+            while count > 0:
+                sent = os.sendfile(sock_fd, f.fileno(), offset, min(count, _CHUNK))
+                if sent == 0:
+                    break
+                offset += sent
+                count -= sent
+        except (AttributeError, OSError) as e:
+            if isinstance(e, (BrokenPipeError, ConnectionResetError)):
+                raise
+            # 不支持 sendfile 的平台退回普通拷贝
+            f.seek(offset)
+            while count > 0:
+                chunk = f.read(min(count, _CHUNK))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                count -= len(chunk)
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} - {format % args}")
+
+
+def serve(storage_path, host='127.0.0.1', port=8088):
+    handler = type('Handler', (RecordingHandler,), {'storage_path': storage_path})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    logging.info(f"Serving recordings from {storage_path} on http://{host}:{port}/events")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,124 @@
+"""全局抖动补偿：差分前估计当前帧相对背景的整体平移并反向平移
+
+廉价支架的轻微振动、自动对焦都会让整幅画面偏移几个像素，与背景差分后变成大面积轮廓，
+导致录下一段什么都没有的视频。这里在缩小到 width 宽的灰度图上做相位相关估计平移，
+相关峰足够可信、位移在合理范围内，且平移后缩略图与背景的残差确实比不平移时下降了 min_gain
+以上时，才把全分辨率灰度帧整像素平移回背景坐标。画面里大块前景运动时相位相关同样会给出
+可信的峰，但那是前景的位移而不是镜头的：按它平移整幅画面只会让静止的背景错位，残差不降反升。
+
+开销按平均值严格限制：每帧获得 budget_ms 的时间额度，补偿实际耗时从额度中扣除，
+额度为负时本帧跳过补偿（按原样差分），因此长期平均每帧开销不超过 budget_ms。
+"""
+import time
+
+import cv2
+import numpy as np
+
+
+class ShakeCompensator:
+
+    def __init__(self, width=160, max_shift=0.05, min_shift=0.5, min_response=0.2, min_gain=0.1, budget_ms=2.0):
+        self.width = width
+        # 最大可补偿位移（占长边的比例），更大的位移视为真实的场景变化
+        self.max_shift = max_shift
+        self.min_shift = min_shift
+        self.min_response = min_response
+        # 平移后缩略图残差至少下降的比例，否则认为峰来自前景运动而不是镜头抖动
+        self.min_gain = min_gain
+        self.budget = budget_ms / 1000.0
+        self.shift = (0.0, 0.0)
+        self.frames = 0
+        self.corrected = 0
+        self.skipped = 0
+        self.rejected = 0
+        self.elapsed = 0.0
+        self._balance = 0.0
+        self._window = None
+
+    def thumbnails(self, gray, background):
+        """返回 (cur, ref, scale)：缩小到 width 宽的 float32 当前帧与背景，以及缩小倍数"""
+        h, w = gray.shape
+        scale = w / self.width if w > self.width else 1.0
+        size = (max(round(w / scale), 8), max(round(h / scale), 8))
+        cur = cv2.resize(gray, size, interpolation=cv2.INTER_AREA).astype(np.float32)
+        ref = cv2.resize(background, size, interpolation=cv2.INTER_AREA)
+        return cur, ref, scale
+
+    def estimate(self, gray, background):
+        """返回 (dx, dy, response)：当前帧相对背景的平移（原图像素）与相关峰响应"""
+        cur, ref, scale = self.thumbnails(gray, background)
+        (dx, dy), response = self._correlate(cur, ref)
+        return dx * scale, dy * scale, response
+
+    def _correlate(self, cur, ref):
+        if self._window is None or self._window.shape != cur.shape:
+            self._window = cv2.createHanningWindow((cur.shape[1], cur.shape[0]), cv2.CV_32F)
+        return cv2.phaseCorrelate(ref, cur, self._window)
+
+    def improves(self, cur, ref, dx, dy):
+        """缩略图上按 (dx, dy)（缩略图像素）平移回去后，与背景的平均绝对差是否下降了 min_gain 以上
+
+        两种残差都只统计去掉最大位移宽度边框后的内部区域，平移引入的复制边缘不参与比较。
+        """
+        h, w = cur.shape
+        m = int(np.ceil(max(abs(dx), abs(dy)))) + 1
+        if 2 * m >= min(w, h):
+            return False
+        shifted = cv2.warpAffine(cur, np.float32([[1, 0, dx], [0, 1, dy]]), (w, h),
+                                 flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REPLICATE)
+        inner = (slice(m, h - m), slice(m, w - m))
+        before = float(cv2.absdiff(cur[inner], ref[inner]).mean())
+        after = float(cv2.absdiff(shifted[inner], ref[inner]).mean())
+        return after <= before * (1.0 - self.min_gain)
+
+    def align(self, gray, background):
+        """返回与背景对齐后的灰度帧；不需要或不能补偿时原样返回 gray"""
+        self.frames += 1
+        # 额度最多攒 4 帧，避免长时间空闲后连续突发
+        self._balance = min(self._balance + self.budget, self.budget * 4)
+        if self._balance < 0 or background is None or background.shape != gray.shape:
+            self.skipped += 1
+            return gray
+        start = time.perf_counter()
+        cur, ref, scale = self.thumbnails(gray, background)
+        (tx, ty), response = self._correlate(cur, ref)
+        dx, dy = tx * scale, ty * scale
+        h, w = gray.shape
+        out = gray
+        self.shift = (0.0, 0.0)
+        if (response >= self.min_response
+                and self.min_shift <= max(abs(dx), abs(dy)) <= self.max_shift * max(w, h)):
+            if self.improves(cur, ref, tx, ty):
+                out = self.translate(gray, round(dx), round(dy))
+                self.shift = (dx, dy)
+                self.corrected += 1
+            else:
+                self.rejected += 1
+        spent = time.perf_counter() - start
+        self._balance -= spent
+        self.elapsed += spent
+        return out
+
+    @staticmethod
+    def translate(gray, dx, dy):
+        """整像素反向平移，边缘复制填充
+
+        输入已做过大核高斯模糊，亚像素插值没有意义；裁剪 + copyMakeBorder 只是内存拷贝，
+        比 warpAffine 便宜一个数量级。
+        """
+        if dx == 0 and dy == 0:
+            return gray
+        h, w = gray.shape
+        src = gray[max(dy, 0):h + min(dy, 0), max(dx, 0):w + min(dx, 0)]
+        return cv2.copyMakeBorder(src, max(-dy, 0), max(dy, 0), max(-dx, 0), max(dx, 0), cv2.BORDER_REPLICATE)
+
+    def stats(self):
+        run = self.frames - self.skipped
+        return {
+            'frames': self.frames,
+            'corrected': self.corrected,
+            'rejected': self.rejected,
+            'skipped': self.skipped,
+            'mean_ms': self.elapsed / run * 1000 if run else 0.0,
+            'amortized_ms': self.elapsed / self.frames * 1000 if self.frames else 0.0,
+        }
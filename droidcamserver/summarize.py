@@ -0,0 +1,101 @@
+"""每日摘要视频：运动片段保留全帧率，静止段稀疏抽帧，叠加时间戳
+
+解码在多个进程中按片段并行进行，每个解码进程只通过小容量队列输出，
+主进程按时间顺序依次编码，全程只在内存中保留少量帧。
+
+用法: droidcamserver summarize /path/to/storage 20261019 --idle-step 40
+"""
+import os
+import logging
+import multiprocessing as mp
+from datetime import timedelta
+
+import cv2
+
+from .detect import MotionDetector
+from .recorder import frame_clock
+from .segments import list_segments
+
+
+def decode_segment(path, start, queue, idle_step, hold_frames):
+    """解码单个片段，把选中的帧（已叠加时间戳）送入有界队列，以 None 结束"""
+    cv2.setNumThreads(1)
+    video = cv2.VideoCapture(path)
+    fps = video.get(cv2.CAP_PROP_FPS) or 20.0
+    # 叠加的时间以 .ts 旁路文件中的真实采集时间为准，静止帧被跳过的区段不会漂移
+    clock = frame_clock(path, fps)
+    detector = MotionDetector()
+    index = 0
+    since_motion = hold_frames + 1
+    try:
+        while True:
+            check, frame = video.read()
+            if not check:
+                break
+            result = detector.process(frame)
+            if result and result[0]:
+                since_motion = 0
+            else:
+                since_motion += 1
+            if since_motion <= hold_frames or index % idle_step == 0:
+                ts = start + timedelta(seconds=clock(index))
+                cv2.putText(frame, ts.strftime("%Y-%m-%d %H:%M:%S"), (10, frame.shape[0] - 12),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+                queue.put(frame)
+            index += 1
+    except Exception as e:
+        logging.error(f"Decode failed for {path}: {e}")
+    finally:
+        video.release()
+        queue.put(None)
+
+
+def summarize(directory, day, output, fps=20.0, idle_step=40, hold=2.0, workers=None, queue_size=4):
+    segments = list_segments(directory, day)
+    if not segments:
+        logging.info(f"No segments for {day} in {directory}")
+        return 0
+    workers = workers or os.cpu_count()
+    hold_frames = int(hold * fps)
+    ctx = mp.get_context('spawn')
+    pending = []  # [(queue, process)]，按片段顺序
+    next_seg = 0
+    out = None
+    size = None
+    written = 0
+
+    def launch():
+        nonlocal next_seg
+        while next_seg < len(segments) and len(pending) < workers:
+            path, start, _ = segments[next_seg]
+            queue = ctx.Queue(maxsize=queue_size)
+            proc = ctx.Process(target=decode_segment, args=(path, start, queue, idle_step, hold_frames), daemon=True)
+            proc.start()
+            pending.append((queue, proc))
+            next_seg += 1
+
+    try:
+        launch()
+        while pending:
+            queue, proc = pending[0]
+            while True:
+                frame = queue.get()
+                if frame is None:
+                    break
+                if out is None:
+                    size = (frame.shape[1], frame.shape[0])
+                    out = cv2.VideoWriter(output, cv2.VideoWriter_fourcc(*'XVID'), fps, size)
+                elif (frame.shape[1], frame.shape[0]) != size:
+                    frame = cv2.resize(frame, size)
+                out.write(frame)
+                written += 1
+            proc.join()
+            pending.pop(0)
+            launch()
+    finally:
+        for queue, proc in pending:
+            proc.terminate()
+        if out is not None:
+            out.release()
+    logging.info(f"Summary written: {output} ({written} frames from {len(segments)} segments)")
+    return written
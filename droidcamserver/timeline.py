@@ -0,0 +1,114 @@
+"""逐帧运动评分时间线：定长二进制记录，按天追加，可直接 np.memmap 读取"""
+import os
+from datetime import datetime
+
+import numpy as np
+
+# 每帧 16 字节：时间戳 / 变化像素比例 / 最大轮廓面积 / 是否录制 / 过载降级级别（旧文件中为 0）
+RECORD_DTYPE = np.dtype([
+    ('ts', '<f8'),
+    ('changed', '<f2'),
+    ('max_area', '<u4'),
+    ('recorded', 'u1'),
+    ('load_level', 'u1'),
+])
+
+
+def day_file(root, camera, day):
+    """返回某摄像头某天的时间线文件路径，day 为 YYYYmmdd 字符串"""
+    return os.path.join(root, 'timeline', camera, f"{day}.bin")
+
+
+def load_day(root, camera, day):
+    """只读映射一天的时间线，文件不存在时返回空数组"""
+    path = day_file(root, camera, day)
+    if not os.path.exists(path) or os.path.getsize(path) < RECORD_DTYPE.itemsize:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    # 忽略写入中断导致的尾部残缺记录
+    count = os.path.getsize(path) // RECORD_DTYPE.itemsize
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(count,))
+
+
+def load_range(root, camera, days):
+    """按顺序拼接多天的时间线（例如一个月）"""
+    parts = [load_day(root, camera, d) for d in days]
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.concatenate(parts)
+
+
+class TimelineWriter:
+    """批量缓冲写入：逐帧只写内存，满批或超时才一次性 write 到文件"""
+
+    def __init__(self, root, camera, batch=512, flush_interval=5.0):
+        self.root = root
+        self.camera = camera
+        self.flush_interval = flush_interval
+        self._buf = np.zeros(batch, dtype=RECORD_DTYPE)
+        self._n = 0
+        self._day = None
+        self._fh = None
+
+    def append(self, ts, changed, max_area, recorded, load_level=0):
+        if self._n == len(self._buf):
+            self.flush()
+        rec = self._buf[self._n]
+        rec['ts'] = ts
+        rec['changed'] = changed
+        rec['max_area'] = max_area
+        rec['recorded'] = recorded
+        rec['load_level'] = load_level
+        self._n += 1
+        if ts - self._buf[0]['ts'] > self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._n == 0:
+            return
+        batch = self._buf[:self._n]
+        # 批次跨零点时按天拆分
+        days = [datetime.fromtimestamp(t).strftime("%Y%m%d") for t in (batch[0]['ts'], batch[-1]['ts'])]
+        if days[0] == days[1]:
+            self._write(days[0], batch)
+        else:
+            for i in range(len(batch)):
+                self._write(datetime.fromtimestamp(batch[i]['ts']).strftime("%Y%m%d"), batch[i:i + 1])
+        self._n = 0
+
+    def _write(self, day, records):
+        if day != self._day:
+            if self._fh is not None:
+                self._fh.close()
+            path = day_file(self.root, self.camera, day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._fh = open(path, 'ab', buffering=0)
+            # 截掉上次异常退出留下的残缺记录，保证对齐
+            size = self._fh.seek(0, os.SEEK_END)
+            if size % RECORD_DTYPE.itemsize:
+                self._fh.truncate(size - size % RECORD_DTYPE.itemsize)
+            self._day = day
+        self._fh.write(records.tobytes())
+
+    def close(self):
+        self.flush()
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+            self._day = None
+
+
+def day_stats(records, min_area=8000):
+    """时间线统计：帧数、运动帧数、录制帧数、降级运行帧数、平均/峰值变化比例"""
+    if not len(records):
+        return dict(frames=0, motion_frames=0, recorded_frames=0, degraded_frames=0,
+                    mean_changed=0.0, peak_changed=0.0)
+    changed = records['changed'].astype(np.float32)
+    return dict(
+        frames=int(len(records)),
+        motion_frames=int(np.count_nonzero(records['max_area'] >= min_area)),
+        recorded_frames=int(np.count_nonzero(records['recorded'])),
+        degraded_frames=int(np.count_nonzero(records['load_level'])),
+        mean_changed=float(changed.mean()),
+        peak_changed=float(changed.max()),
+    )
@@ -0,0 +1,96 @@
+"""逐帧生命周期追踪：各阶段耗时写入预分配环形缓冲，可导出为 Chrome / Perfetto trace JSON
+
+记录只做几次数组赋值，不分配对象，短时间在生产环境开启也可以接受。
+用法：
+    tracer.frame = frame_no
+    t0 = tracer.now()
+    ...
+    tracer.span('capture', t0)
+"""
+import os
+import json
+import time
+import threading
+
+import numpy as np
+
+STAGES = ('capture', 'preprocess', 'background', 'contours', 'verify', 'write', 'rollover', 'timeline', 'publish',
+          'archive', 'stabilize')
+_STAGE_ID = {name: i for i, name in enumerate(STAGES)}
+
+
+class Tracer:
+
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self._stage = np.zeros(capacity, np.uint8)
+        self._frame = np.zeros(capacity, np.int64)
+        self._start = np.zeros(capacity, np.int64)
+        self._dur = np.zeros(capacity, np.int64)
+        self._tid = np.zeros(capacity, np.uint64)
+        self._n = 0
+        # 当前帧号，由主循环在每帧开始时设置
+        self.frame = 0
+        self._origin = time.perf_counter_ns()
+
+    now = staticmethod(time.perf_counter_ns)
+
+    def span(self, stage, start, end=None):
+        """记录 [start, end) 区间，返回 end，便于连续阶段首尾相接"""
+        end = time.perf_counter_ns() if end is None else end
+        i = self._n % self.capacity
+        self._stage[i] = _STAGE_ID[stage]
+        self._frame[i] = self.frame
+        self._start[i] = start
+        self._dur[i] = end - start
+        self._tid[i] = threading.get_ident()
+        self._n += 1
+        return end
+
+    def __len__(self):
+        return min(self._n, self.capacity)
+
+    def events(self):
+        """按时间顺序返回 Chrome trace 的 X（complete）事件"""
+        n = len(self)
+        first = self._n - n
+        idx = [(first + k) % self.capacity for k in range(n)]
+        tids = {}
+        events = []
+        for i in idx:
+            tid = tids.setdefault(int(self._tid[i]), len(tids) + 1)
+            events.append({
+                'name': STAGES[self._stage[i]],
+                'ph': 'X',
+                'ts': (int(self._start[i]) - self._origin) / 1000.0,
+                'dur': int(self._dur[i]) / 1000.0,
+                'pid': os.getpid(),
+                'tid': tid,
+                'args': {'frame': int(self._frame[i])},
+            })
+        return events
+
+    def dump(self, path):
+        """写出 trace JSON（可在 chrome://tracing 或 ui.perfetto.dev 打开）"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'traceEvents': self.events(), 'displayTimeUnit': 'ms'}, f)
+        os.replace(tmp, path)
+        return path
+
+
+class NullTracer:
+    """追踪关闭时的占位实现，主循环无需逐处判断"""
+
+    frame = 0
+
+    @staticmethod
+    def now():
+        return 0
+
+    def span(self, stage, start, end=None):
+        return 0
+
+    def __len__(self):
+        return 0
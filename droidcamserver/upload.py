@@ -0,0 +1,275 @@
+"""关闭后的片段异步上传到 S3 兼容存储
+
+- 大文件走分片上传，分片在线程池中并行发送，连接由 botocore 连接池复用
+- 上传状态（upload_id、已完成分片）持久化在 storage_path/upload_state.sqlite，中断后续传
+- 全局令牌桶限速：每个分片发送前按其字节数取令牌（botocore 计算校验和时会重复读取 Body，
+  因此不在流读取层计数）
+- 录制循环只调用 enqueue()，实际上传在后台线程中进行
+
+需要可选依赖 boto3：pip install droidcamserver[s3]
+"""
+import os
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .segments import SEGMENT_RE, index_path, timestamps_path
+
+STATE_FILE = 'upload_state.sqlite'
+
+
+class TokenBucket:
+    """按字节计的令牌桶，rate 为字节/秒，0 表示不限速"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n):
+        if self.rate <= 0:
+            return
+        while n > 0:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                take = min(n, self._tokens)
+                self._tokens -= take
+                n -= take
+                wait = n / self.rate if n > 0 else 0
+            if wait:
+                time.sleep(min(wait, 1.0))
+
+
+class UploadState:
+    """持久化上传状态；sqlite 连接按线程各自打开"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._db() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS uploads (
+                path TEXT PRIMARY KEY, key TEXT, size INTEGER, mtime REAL,
+                upload_id TEXT, status TEXT, updated REAL)""")
+            db.execute("""CREATE TABLE IF NOT EXISTS parts (
+                path TEXT, part INTEGER, etag TEXT, PRIMARY KEY (path, part))""")
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            self._local.db = db
+        return db
+
+    def get(self, path):
+        row = self._db().execute(
+            "SELECT key, size, mtime, upload_id, status FROM uploads WHERE path = ?", (path,)).fetchone()
+        return None if row is None else dict(zip(('key', 'size', 'mtime', 'upload_id', 'status'), row))
+
+    def begin(self, path, key, size, mtime, upload_id):
+        with self._db() as db:
+            db.execute("DELETE FROM parts WHERE path = ?", (path,))
+            db.execute("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, 'uploading', ?)",
+                       (path, key, size, mtime, upload_id, time.time()))
+
+    def part_done(self, path, part, etag):
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO parts VALUES (?, ?, ?)", (path, part, etag))
+
+    def is_done(self, path, st=None):
+        """已完整上传且之后文件未变化"""
+        st = st or os.stat(path)
+        record = self.get(path)
+        return bool(record and record['status'] == 'done' and record['size'] == st.st_size
+                    and record['mtime'] == st.st_mtime)
+
+    def finish(self, path, key, size, mtime):
+        with self._db() as db:
+            db.execute("DELETE FROM parts WHERE path = ?", (path,))
+            db.execute("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, NULL, 'done', ?)",
+                       (path, key, size, mtime, time.time()))
+
+    def counts(self):
+        return dict(self._db().execute("SELECT status, COUNT(*) FROM uploads GROUP BY status").fetchall())
+
+
+class S3Uploader:
+
+    def __init__(self, settings, storage_path):
+        try:
+            import boto3
+            from botocore.config import Config as BotoConfig
+        except ImportError as e:
+            raise ValueError("S3 upload needs boto3: pip install droidcamserver[s3]") from e
+        self.settings = settings
+        self.storage_path = storage_path
+        self.part_size = max(int(settings.part_size_mb * 1024 * 1024), 5 * 1024 * 1024)
+        self.state = UploadState(os.path.join(storage_path, STATE_FILE))
+        self.bucket = TokenBucket(settings.max_mbps * 125000)
+        self.client = boto3.client(
+            's3',
+            endpoint_url=settings.endpoint or None,
+            region_name=settings.region or None,
+            aws_access_key_id=settings.access_key or None,
+            aws_secret_access_key=settings.secret_key or None,
+            config=BotoConfig(max_pool_connections=settings.workers * 2,
+                              retries={'max_attempts': 5, 'mode': 'standard'}),
+        )
+        self._parts = ThreadPoolExecutor(max_workers=settings.workers, thread_name_prefix='s3-part')
+
+    def key_for(self, path):
+        name = os.path.basename(path)
+        return f"{self.settings.prefix.strip('/')}/{name}" if self.settings.prefix else name
+
+    def upload(self, path):
+        """上传一个文件（已上传且未变化时跳过），返回是否真正上传"""
+        st = os.stat(path)
+        key = self.key_for(path)
+        record = self.state.get(path)
+        if record and record['status'] == 'done' and record['size'] == st.st_size and record['mtime'] == st.st_mtime:
+            return False
+        start = time.monotonic()
+        if st.st_size <= self.part_size:
+            with open(path, 'rb') as f:
+                data = f.read()
+            self.bucket.consume(len(data))
+            self.client.put_object(Bucket=self.settings.bucket, Key=key, Body=data)
+        else:
+            self._multipart(path, key, st, record)
+        self.state.finish(path, key, st.st_size, st.st_mtime)
+        elapsed = time.monotonic() - start
+        logging.info(f"Uploaded {path} -> s3://{self.settings.bucket}/{key} "
+                     f"({st.st_size / 1048576:.1f} MB, {st.st_size / 1048576 / max(elapsed, 1e-6):.1f} MB/s)")
+        return True
+
+    def _multipart(self, path, key, st, record):
+        bucket = self.settings.bucket
+        upload_id = None
+        done = {}
+        if record and record['upload_id'] and record['size'] == st.st_size and record['mtime'] == st.st_mtime:
+            # 续传：以服务端已有分片为准
+            upload_id = record['upload_id']
+            try:
+                done = self._list_parts(key, upload_id)
+                logging.info(f"Resuming {path}: {len(done)} parts already uploaded")
+            except self.client.exceptions.NoSuchUpload:
+                upload_id = None
+        elif record and record['upload_id']:
+            # 文件在上次中断后变了（如被压缩替换）：旧的分片上传作废，释放服务端已存的分片
+            self._abort(key, record['upload_id'])
+        if upload_id is None:
+            upload_id = self.client.create_multipart_upload(Bucket=bucket, Key=key)['UploadId']
+            self.state.begin(path, key, st.st_size, st.st_mtime, upload_id)
+            done = {}
+
+        count = (st.st_size + self.part_size - 1) // self.part_size
+        futures = {n: self._parts.submit(self._upload_part, path, key, upload_id, n)
+                   for n in range(1, count + 1) if n not in done}
+        for n, future in futures.items():
+            done[n] = future.result()
+        self.client.complete_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={'Parts': [{'PartNumber': n, 'ETag': done[n]} for n in sorted(done)]},
+        )
+
+    def _upload_part(self, path, key, upload_id, number):
+        with open(path, 'rb') as f:
+            f.seek((number - 1) * self.part_size)
+            data = f.read(self.part_size)
+        self.bucket.consume(len(data))
+        etag = self.client.upload_part(
+            Bucket=self.settings.bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=data,
+        )['ETag']
+        self.state.part_done(path, number, etag)
+        return etag
+
+    def _abort(self, key, upload_id):
+        try:
+            self.client.abort_multipart_upload(Bucket=self.settings.bucket, Key=key, UploadId=upload_id)
+            logging.info(f"Aborted stale multipart upload {upload_id} for {key}")
+        except self.client.exceptions.NoSuchUpload:
+            pass
+        except Exception as e:
+            logging.warning(f"Cannot abort stale multipart upload {upload_id} for {key}: {e}")
+
+    def _list_parts(self, key, upload_id):
+        parts = {}
+        kwargs = dict(Bucket=self.settings.bucket, Key=key, UploadId=upload_id)
+        while True:
+            resp = self.client.list_parts(**kwargs)
+            for p in resp.get('Parts', []):
+                parts[p['PartNumber']] = p['ETag']
+            if not resp.get('IsTruncated'):
+                return parts
+            kwargs['PartNumberMarker'] = resp['NextPartNumberMarker']
+
+    def pending(self):
+        """存储目录中尚未成功上传的片段（含时间戳旁路文件）"""
+        paths = []
+        for name in sorted(os.listdir(self.storage_path)):
+            if not SEGMENT_RE.match(name):
+                continue
+            path = os.path.join(self.storage_path, name)
+            for p in (path, timestamps_path(path), index_path(path)):
+                if not os.path.exists(p):
+                    continue
+                if not self.state.is_done(p):
+                    paths.append(p)
+        return paths
+
+    def close(self):
+        self._parts.shutdown(wait=True)
+
+
+class UploadQueue(threading.Thread):
+    """后台上传线程：enqueue() 从不阻塞，失败的文件延迟后重试"""
+
+    def __init__(self, uploader, retry_delay=60.0, maxsize=1000):
+        super().__init__(name='uploader', daemon=True)
+        self.uploader = uploader
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._halt = threading.Event()
+
+    def enqueue(self, path):
+        """SegmentRecorder.on_close 回调：片段及其时间戳、定位索引旁路文件入队"""
+        for p in (path, timestamps_path(path), index_path(path)):
+            try:
+                self._queue.put_nowait(p)
+            except queue.Full:
+                # 队列满时丢弃，启动时的 pending 扫描会补上
+                logging.warning(f"Upload queue full, deferring {p}")
+
+    def run(self):
+        # 启动时先续传上次未完成的文件
+        for path in self.uploader.pending():
+            self.enqueue_existing(path)
+        while not self._halt.is_set():
+            try:
+                path = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            if not os.path.exists(path):
+                continue
+            try:
+                self.uploader.upload(path)
+            except Exception as e:
+                logging.error(f"Upload failed for {path}: {e}, retrying in {self.retry_delay:.0f}s")
+                timer = threading.Timer(self.retry_delay, self.enqueue_existing, (path,))
+                timer.daemon = True
+                timer.start()
+
+    def enqueue_existing(self, path):
+        try:
+            self._queue.put_nowait(path)
+        except queue.Full:
+            pass
+
+    def stop(self):
+        self._halt.set()
@@ -0,0 +1,152 @@
+"""二级确认：只在运动轮廓的外接框上运行 HOG 行人检测，确认有目标后才开始录制
+
+HOG 的 detectMultiScale 会释放 GIL，因此用线程池即可并行，且无需在进程间复制帧。
+"""
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+# HOG 默认行人窗口为 64x128，外接框高度不足时放大到该尺寸
+_HOG_HEIGHT = 128
+_local = threading.local()
+
+
+def _hog():
+    hog = getattr(_local, 'hog', None)
+    if hog is None:
+        hog = cv2.HOGDescriptor()
+        hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        _local.hog = hog
+    return hog
+
+
+def motion_regions(frame_shape, contours, min_area, pad=0.15, limit=4):
+    """取面积最大的若干运动轮廓，返回按比例外扩后的外接框 [(x, y, w, h)]"""
+    h, w = frame_shape[:2]
+    boxes = []
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:limit]:
+        if cv2.contourArea(contour) < min_area:
+            break
+        x, y, bw, bh = cv2.boundingRect(contour)
+        dx, dy = int(bw * pad), int(bh * pad)
+        x0, y0 = max(x - dx, 0), max(y - dy, 0)
+        boxes.append((x0, y0, min(x + bw + dx, w) - x0, min(y + bh + dy, h) - y0))
+    return boxes
+
+
+def detect_people(rois, hit_threshold=0.0):
+    """在各外接框图像上运行 HOG，任一命中即返回 True"""
+    hog = _hog()
+    for roi in rois:
+        h, w = roi.shape[:2]
+        if h < _HOG_HEIGHT or w < 64:
+            scale = max(_HOG_HEIGHT / h, 64 / w)
+            roi = cv2.resize(roi, (int(w * scale) + 1, int(h * scale) + 1))
+        rects, _ = hog.detectMultiScale(roi, hitThreshold=hit_threshold, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        if len(rects):
+            return True
+    return False
+
+
+class CascadeVerifier:
+    """异步确认运动候选；同一时刻只有一个候选在验证，超时按 fail_open 决定是否放行
+
+    超时的候选会被取消；已在线程里运行、无法取消的检测结束前不接受新候选，
+    避免 HOG 持续慢于 max_latency 时任务在线程池队列里无限堆积（排队时间也会计入后续候选的延迟）。
+    """
+
+    def __init__(self, min_area=8000, workers=2, max_latency=0.5, fail_open=True, hit_threshold=0.0):
+        if not hasattr(cv2, 'HOGDescriptor'):
+            raise ValueError(f"OpenCV {cv2.__version__} has no HOGDescriptor, cannot enable verification")
+        self.min_area = min_area
+        self.max_latency = max_latency
+        self.fail_open = fail_open
+        self.hit_threshold = hit_threshold
+        self.latencies = deque(maxlen=500)
+        self.confirmed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='verify')
+        self._pending = None  # (future, submitted_at)
+        self._abandoned = []  # 超时后仍在运行的检测
+        self._skipped_now = False
+
+    @property
+    def pending(self):
+        return self._pending is not None
+
+    def submit(self, frame, contours):
+        """提交一个候选帧；已有候选在验证时忽略"""
+        if self._pending is not None:
+            return
+        if self._abandoned:
+            self._abandoned = [f for f in self._abandoned if not f.done()]
+            if self._abandoned:
+                self.skipped += 1
+                self._skipped_now = True
+                return
+        boxes = motion_regions(frame.shape, contours, self.min_area)
+        if not boxes:
+            return
+        # 只复制外接框对应的像素，避免主循环复用 frame 时数据被改写
+        rois = [frame[y:y + h, x:x + w].copy() for x, y, w, h in boxes]
+        future = self._pool.submit(detect_people, rois, self.hit_threshold)
+        self._pending = (future, time.monotonic())
+
+    def poll(self):
+        """返回 True（确认）/ False（否决）/ None（仍在验证或没有候选）"""
+        if self._pending is None:
+            # 检测线程仍忙而跳过的候选：fail_open 时直接放行
+            skipped, self._skipped_now = self._skipped_now, False
+            return True if skipped and self.fail_open else None
+        future, submitted = self._pending
+        elapsed = time.monotonic() - submitted
+        if future.done():
+            self._pending = None
+            self.latencies.append(elapsed)
+            try:
+                ok = future.result()
+            except Exception as e:
+                logging.error(f"Verification failed: {e}")
+                ok = self.fail_open
+            if ok:
+                self.confirmed += 1
+            else:
+                self.rejected += 1
+            return ok
+        if elapsed > self.max_latency:
+            # 超时后放弃等待：尚未开始的取消，已在运行的等其结束后才接受新候选
+            self._abandon()
+            self.timeouts += 1
+            self.latencies.append(elapsed)
+            logging.warning(f"Verification exceeded {self.max_latency:.2f}s, {'accepting' if self.fail_open else 'rejecting'} candidate")
+            return self.fail_open
+        return None
+
+    def _abandon(self):
+        if self._pending is None:
+            return
+        future = self._pending[0]
+        self._pending = None
+        if not future.cancel() and not future.done():
+            self._abandoned.append(future)
+
+    def reset(self):
+        self._abandon()
+
+    def stats(self):
+        lat = sorted(self.latencies)
+        p95 = lat[min(int(len(lat) * 0.95), len(lat) - 1)] if lat else 0.0
+        mean = sum(lat) / len(lat) if lat else 0.0
+        return dict(confirmed=self.confirmed, rejected=self.rejected, timeouts=self.timeouts,
+                    skipped=self.skipped, mean_latency=mean, p95_latency=p95)
+
+    def close(self):
+        # shutdown(cancel_futures=True) 需要 Python 3.9；队列里至多一个候选，直接取消即可
+        self._abandon()
+        self._pool.shutdown(wait=False)
@@ -1,45 +1,8 @@
-# Python program to illustrate
-# saving an operated video
+# 实时预览并录制到 output.avi（按 a 或 q 退出）：采集、显示、写盘在独立线程，见 droidcamserver/preview.py
+# 其它参数可直接追加，例如 python main.py --display-fps 10 --width 480
+import sys
 
-# organize imports
-import numpy as np
-import cv2
+from droidcamserver.cli import main
 
-# This will return video from the first webcam on your computer.
-cap = cv2.VideoCapture('http://192.168.8.132:4747/video')
-
-# Define the codec and create VideoWriter object
-fourcc = cv2.VideoWriter_fourcc(*'XVID')
-out = cv2.VideoWriter('output.avi', fourcc, 20.0, (640, 480))
-
-# loop runs if capturing has been initialized. 
-while (True):
-    # reads frames from a camera 
-    # ret checks return at each frame
-    ret, frame = cap.read()
-
-    # Converts to HSV color space, OCV reads colors as BGR
-    # frame is converted to hsv
-    #hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-
-    # output the frame
-    out.write(frame)
-
-    # The original input frame is shown in the window 
-    cv2.imshow('Original', frame)
-
-    # The window showing the operated video stream 
-    #cv2.imshow('frame', hsv)
-
-    # Wait for 'a' key to stop the program
-    if cv2.waitKey(1) & 0xFF == ord('a'):
-        break
-
-# Close the window / Release webcam
-cap.release()
-
-# After we release our webcam, we also release the output
-out.release()
-
-# De-allocate any associated memory usage 
-cv2.destroyAllWindows()
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(main(['preview', 'http://192.168.8.132:4747/video', '--output', 'output.avi'] + sys.argv[1:]))
@@ -0,0 +1,136 @@
+"""S3Uploader / UploadQueue 行为测试：用 moto 在进程内模拟 S3（pip install .[test]）"""
+import os
+import time
+
+import pytest
+
+boto3 = pytest.importorskip('boto3')
+moto = pytest.importorskip('moto')
+
+from droidcamserver.config import UploadSettings
+from droidcamserver.upload import S3Uploader, UploadQueue
+
+BUCKET = 'droidcam'
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    for name, value in (('AWS_ACCESS_KEY_ID', 'test'), ('AWS_SECRET_ACCESS_KEY', 'test'),
+                        ('AWS_DEFAULT_REGION', 'us-east-1')):
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture
+def uploader(s3, tmp_path):
+    u = S3Uploader(UploadSettings(bucket=BUCKET, region='us-east-1', prefix='cam1', workers=2, part_size_mb=5),
+                   str(tmp_path))
+    yield u
+    u.close()
+
+
+def write(path, size, fill=b'x'):
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size) if fill is None else fill * size)
+    return str(path)
+
+
+def body(s3, key):
+    return s3.get_object(Bucket=BUCKET, Key=key)['Body'].read()
+
+
+def test_single_part_upload_and_skip_unchanged(s3, uploader, tmp_path):
+    path = write(tmp_path / '20261019120000.avi', 1000)
+    assert uploader.upload(path)
+    assert body(s3, 'cam1/20261019120000.avi') == b'x' * 1000
+    assert uploader.state.is_done(path)
+    # 已上传且未变化时跳过
+    assert not uploader.upload(path)
+
+
+def test_multipart_resumes_from_server_parts(s3, uploader, tmp_path, monkeypatch):
+    path = write(tmp_path / '20261019120000.avi', 12 * MB, fill=None)
+    original = S3Uploader._upload_part
+
+    def fail_part_two(self, path, key, upload_id, number):
+        if number == 2:
+            raise ConnectionError("link dropped")
+        return original(self, path, key, upload_id, number)
+
+    monkeypatch.setattr(S3Uploader, '_upload_part', fail_part_two)
+    with pytest.raises(ConnectionError):
+        uploader.upload(path)
+    record = uploader.state.get(path)
+    assert record['status'] == 'uploading' and record['upload_id']
+    already = set(uploader._list_parts('cam1/20261019120000.avi', record['upload_id']))
+    assert 1 in already and 2 not in already
+
+    resumed = []
+    monkeypatch.setattr(S3Uploader, '_upload_part',
+                        lambda self, *args: resumed.append(args[-1]) or original(self, *args))
+    assert uploader.upload(path)
+    # 续传只发送服务端没有的分片
+    assert sorted(resumed) == sorted({1, 2, 3} - already)
+    with open(path, 'rb') as f:
+        assert body(s3, 'cam1/20261019120000.avi') == f.read()
+    assert not s3.list_multipart_uploads(Bucket=BUCKET).get('Uploads')
+
+
+def test_changed_file_aborts_stale_multipart(s3, uploader, tmp_path, monkeypatch):
+    path = write(tmp_path / '20261019120000.avi', 11 * MB)
+    original = S3Uploader._upload_part
+
+    def fail(self, path, key, upload_id, number):
+        raise ConnectionError("link dropped")
+
+    monkeypatch.setattr(S3Uploader, '_upload_part', fail)
+    with pytest.raises(ConnectionError):
+        uploader.upload(path)
+    stale = uploader.state.get(path)['upload_id']
+
+    # 文件在中断期间被替换（例如被压缩）
+    write(path, 6 * MB, fill=b'y')
+    monkeypatch.setattr(S3Uploader, '_upload_part', original)
+    assert uploader.upload(path)
+    uploads = s3.list_multipart_uploads(Bucket=BUCKET).get('Uploads', [])
+    assert stale not in [u['UploadId'] for u in uploads]
+    assert body(s3, 'cam1/20261019120000.avi') == b'y' * 6 * MB
+
+
+def test_pending_lists_segments_and_sidecars_until_uploaded(uploader, tmp_path):
+    video = write(tmp_path / '20261019120000.avi', 100)
+    ts = write(tmp_path / '20261019120000.ts', 16)
+    idx = write(tmp_path / '20261019120000.idx', 24)
+    write(tmp_path / 'summary_20261019.avi', 100)
+    write(tmp_path / '20261019120000.avi.compact.avi', 100)
+    assert uploader.pending() == [video, ts, idx]
+
+    for p in uploader.pending():
+        uploader.upload(p)
+    assert uploader.pending() == []
+
+    # 上传后文件变化（大小或 mtime）会重新进入待上传
+    write(video, 50)
+    os.utime(video, (time.time() + 10, time.time() + 10))
+    assert uploader.pending() == [video]
+
+
+def test_queue_uploads_in_background(s3, uploader, tmp_path):
+    video = write(tmp_path / '20261019120000.avi', 100)
+    write(tmp_path / '20261019120000.ts', 16)
+    queue = UploadQueue(uploader, retry_delay=0.1)
+    queue.start()
+    try:
+        queue.enqueue(video)
+        deadline = time.monotonic() + 10
+        while uploader.pending() and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        queue.stop()
+    assert uploader.pending() == []
+    keys = {o['Key'] for o in s3.list_objects_v2(Bucket=BUCKET)['Contents']}
+    assert keys == {'cam1/20261019120000.avi', 'cam1/20261019120000.ts'}
@@ -1,65 +0,0 @@
-import smtplib, ssl
-
-from email import encoders
-from email.mime.base import MIMEBase
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-
-import configparser
-
-config = configparser.ConfigParser()
-config.read_file(open(r'private_config.txt'))
-
-# config file looks like:
-# [mail_setting]
-# sender_email = xxxx
-# receiver_email = xxxx
-# password = xxxxx
-
-
-subject = "An email with attachment from Python"
-body = "This is an email with attachment sent from Python"
-sender_email = config.get('mail_setting', 'sender_email')
-receiver_email = config.get('mail_setting', 'receiver_email')
-password = config.get('mail_setting', 'password')
-# smtp server , such as : "smtp.163.com"
-smtp_ssl_server = config.get('mail_setting', 'password')
-
-
-# Create a multipart message and set headers
-message = MIMEMultipart()
-message["From"] = sender_email
-message["To"] = receiver_email
-message["Subject"] = subject
-message["Bcc"] = receiver_email  # Recommended for mass emails
-
-# Add body to email
-message.attach(MIMEText(body, "plain"))
-
-filename = "output.avi"  # In same directory as script
-
-# Open PDF file in binary mode
-with open(filename, "rb") as attachment:
-    # Add file as application/octet-stream
-    # Email client can usually download this automatically as attachment
-    part = MIMEBase("application", "octet-stream")
-    part.set_payload(attachment.read())
-
-# Encode file in ASCII characters to send by email
-encoders.encode_base64(part)
-
-# Add header as key/value pair to attachment part
-part.add_header(
-    "Content-Disposition",
-    f"attachment; filename= {filename}",
-)
-
-# Add attachment to message and convert message to string
-message.attach(part)
-text = message.as_string()
-
-# Log in to server using secure context and send email
-context = ssl.create_default_context()
-with smtplib.SMTP_SSL(smtp_ssl_server, 465, context=context) as server:
-    server.login(sender_email, password)
-    server.sendmail(sender_email, receiver_email, text)
\ No newline at end of file